@@ -0,0 +1,174 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from functools import reduce
+import rateindex
+import store
+
+# okna średniej kroczącej do wyboru na stronie (w notowaniach, nie w dniach kalendarzowych)
+WINDOWS = (5, 10, 20, 60)
+MAX_WINDOW = 260
+# ile liczb naraz trzyma tablica kursów krzyżowych przy liczeniu minimum i maksimum
+CHUNK = 1_000_000
+# limit pamięci na zapamiętane wyniki; klucz zawiera daty wybrane przez klienta, więc liczba wpisów nie wystarcza
+MEMO_BYTES = int(os.environ.get('ANALYTICS_MEMO_MAX_BYTES', 64 * 1024 * 1024))
+# przybliżony koszt jednej liczby albo daty w liście: obiekt Pythona i wskaźnik na niego
+ITEM_BYTES = 32
+
+_memo = OrderedDict()
+_memo_bytes = 0
+_memo_lock = threading.Lock()
+
+
+def _numpy():
+    # numpy importujemy dopiero przy pierwszym obliczeniu, żeby nie wydłużać startu serwera
+    import numpy
+    return numpy
+
+
+def _size(value):
+    if isinstance(value, dict):
+        return sum(_size(v) for v in value.values())
+    if isinstance(value, list) and value and isinstance(value[0], list):
+        return sum(_size(v) for v in value)
+    if isinstance(value, list):
+        return ITEM_BYTES * len(value)
+    return ITEM_BYTES
+
+
+def _memoized(key, compute):
+    # klucz zawiera wersje danych, więc po nowych notowaniach stare wyniki po prostu wypadają z LRU
+    global _memo_bytes
+    with _memo_lock:
+        if key in _memo:
+            _memo.move_to_end(key)
+            return _memo[key][1]
+    result = compute()
+    size = _size(result)
+    if size > MEMO_BYTES:
+        return result
+    with _memo_lock:
+        if key not in _memo:
+            _memo[key] = (size, result)
+            _memo_bytes += size
+        while _memo_bytes > MEMO_BYTES:
+            _memo_bytes -= _memo.popitem(last=False)[1][0]
+    return result
+
+
+def _digest(*arrays):
+    # skrót danych do ETag, ten sam we wszystkich procesach serwera
+    h = hashlib.sha256()
+    for array in arrays:
+        h.update(bytes(array))
+    return h.hexdigest()[:16]
+
+
+def _values(array):
+    return [None if v != v else v for v in array.tolist()]
+
+
+def _dates(days):
+    return [rateindex.iso(day) for day in days.tolist()]
+
+
+def moving_average(mids, window):
+    np = _numpy()
+    result = np.full(len(mids), np.nan)
+    if window <= len(mids):
+        sums = np.cumsum(np.concatenate(([0.0], mids)))
+        result[window - 1:] = (sums[window:] - sums[:-window]) / window
+    return result
+
+
+def changes(mids):
+    np = _numpy()
+    result = np.full(len(mids), np.nan)
+    result[1:] = (mids[1:] / mids[:-1] - 1) * 100
+    return result
+
+
+def rate_stats(code, start, end, window):
+    version, days, mids = store.get_columns([code], start, end)[code]
+
+    def compute():
+        np = _numpy()
+        values = np.frombuffer(mids, dtype=np.float64)
+        return {
+            'etag': _digest(days, mids, str(window).encode()),
+            'dates': _dates(days),
+            'mid': values.tolist(),
+            'change': _values(changes(values)),
+            'ma': _values(moving_average(values, window)),
+        }
+
+    return _memoized(('stats', code, version, start, end, window), compute)
+
+
+def _aligned(columns):
+    np = _numpy()
+    # wspólne dni notowań wszystkich walut i kursy ułożone w tablicę dni x waluty
+    days = [np.frombuffer(d, dtype=np.int32) for _, d, _ in columns]
+    common = reduce(np.intersect1d, days)
+    values = np.empty((len(common), len(columns)))
+    for k, (d, (_, _, mids)) in enumerate(zip(days, columns)):
+        values[:, k] = np.frombuffer(mids, dtype=np.float64)[np.searchsorted(d, common)]
+    return common, values
+
+
+def cross_rates(base, quote, start, end):
+    columns = store.get_columns([base, quote], start, end)
+    key = ('cross', base, quote, columns[base][0], columns[quote][0], start, end)
+
+    def compute():
+        common, values = _aligned([columns[base], columns[quote]])
+        return {
+            'etag': _digest(common, values),
+            'dates': _dates(common),
+            'rate': (values[:, 0] / values[:, 1]).tolist(),
+        }
+
+    return _memoized(key, compute)
+
+
+def cross_matrix(codes, start, end):
+    columns = store.get_columns(codes, start, end)
+    codes = [code for code in codes if len(columns[code][1])]
+    if not codes:
+        return None
+    key = ('matrix', tuple(codes), tuple(columns[code][0] for code in codes), start, end)
+
+    def compute():
+        np = _numpy()
+        common, values = _aligned([columns[code] for code in codes])
+        if not len(common):
+            return None
+
+        first, last = values[0], values[-1]
+        # kurs krzyżowy i-j to ile jednostek waluty j kosztuje jednostka waluty i
+        rate = last[:, None] / last[None, :]
+        growth = last / first
+        change = (growth[:, None] / growth[None, :] - 1) * 100
+
+        low = np.full(rate.shape, np.inf)
+        high = np.full(rate.shape, -np.inf)
+        step = max(1, CHUNK // (len(codes) ** 2))
+        for i in range(0, len(values), step):
+            block = values[i:i + step]
+            cross = block[:, :, None] / block[:, None, :]
+            np.minimum(low, cross.min(axis=0), out=low)
+            np.maximum(high, cross.max(axis=0), out=high)
+
+        return {
+            'etag': _digest(common, values, ','.join(codes).encode()),
+            'codes': codes,
+            'first': rateindex.iso(int(common[0])),
+            'last': rateindex.iso(int(common[-1])),
+            'rate': rate.tolist(),
+            'change': change.tolist(),
+            'min': low.tolist(),
+            'max': high.tolist(),
+        }
+
+    return _memoized(key, compute)
@@ -1,106 +1,472 @@
-from flask import Flask, render_template, request, send_from_directory
-from datetime import datetime, timedelta
-import requests
-import pandas as pd
-import matplotlib.pyplot as plt
+from flask import Flask, render_template, request, send_from_directory, jsonify, abort, make_response, g
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+from urllib.parse import urlencode
+import hashlib
 import os
+import time
+import nbp
+import store
+import charts
+import exports
+import downsample
+import renderer
+import filecache
+import analytics
+import catalog
+import metrics
 
 app = Flask(__name__)
+app.config['SERVER_TIMING'] = os.environ.get('SERVER_TIMING') == '1'
 
-CURRENCIES = {
-    'USD': 'Dolar amerykański',
-    'EUR': 'Euro',
-    'DKK': 'Korona duńska',
-    'GBP': 'Funt brytyjski',
-    'CHF': 'Frank szwajcarski',
-    'JPY': 'Jen japoński',
-    'CAD': 'Dolar kanadyjski',
-    'AUD': 'Dolar australijski',
-    'NOK': 'Korona norweska',
-    'CZK': 'Korona czeska'
-}
+# zakresy z listy wyboru na stronie (w tygodniach)
+WEEKS = range(1, 9)
 
-@app.route('/')
-def index():
+def templates_version():
+    folder = os.path.join(app.root_path, app.template_folder)
+    h = hashlib.sha256()
+    for name in sorted(os.listdir(folder)):
+        with open(os.path.join(folder, name), 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()[:8]
+
+TEMPLATES_VERSION = templates_version()
+
+Period = namedtuple('Period', 'start end label query')
+
+def days_back(today, days):
+    # dłuższy zakres i tak zaczyna się od pierwszej tabeli NBP, a timedelta nie przyjmie dowolnie dużej liczby
+    return today - timedelta(days=min(max(days, 0), (today - nbp.FIRST_DATE).days))
+
+def weeks_period(weeks, today):
+    return Period(days_back(today, 7 * weeks), today, f'ostatnie {weeks} tygodni', urlencode({'time': weeks}))
+
+def get_period():
+    today = datetime.today().date()
+    start_arg = request.args.get('start')
+    end_arg = request.args.get('end')
+
+    if start_arg or end_arg:
+        try:
+            end = min(date.fromisoformat(end_arg), today) if end_arg else today
+            start = date.fromisoformat(start_arg) if start_arg else end - timedelta(weeks=1)
+        except ValueError:
+            abort(400, "Nieprawidłowa data, oczekiwano formatu RRRR-MM-DD")
+        start = max(start, nbp.FIRST_DATE)
+        if start > end:
+            abort(400, "Data początkowa jest późniejsza niż końcowa")
+        return Period(start, end, f'{start} - {end}',
+                      urlencode({'start': start.isoformat(), 'end': end.isoformat()}))
+
+    years = request.args.get('years', 0, type=int)
+    if years > 0:
+        start = days_back(today, round(365.25 * years))
+        return Period(start, today, f'ostatnie {years} lat', urlencode({'years': years}))
+
+    return weeks_period(request.args.get('time', 1, type=int), today)
+
+def get_params():
     code = request.args.get('currency', 'EUR').upper()
-    if code not in CURRENCIES:
+    if catalog.get(code) is None:
         code = 'EUR'
+    return code, get_period()
+
+def get_downsampling():
+    method = request.args.get('downsample', 'lttb')
+    if method not in downsample.METHODS:
+        method = 'lttb'
+    points = request.args.get('points', downsample.DEFAULT_POINTS, type=int)
+    return method, points
+
+def chart_series(rates):
+    return downsample.reduce(rates, *get_downsampling())
+
+def downsampling_query():
+    # wykres rysowany w przeglądarce dostaje z API tyle samo punktów co obrazek PNG
+    method, points = get_downsampling()
+    return urlencode({'points': points, 'downsample': method})
+
+def get_window():
+    window = request.args.get('ma', 0, type=int)
+    return window if 2 <= window <= analytics.MAX_WINDOW else None
+
+def chart_overlay(code, period, series):
+    window = get_window()
+    if not window:
+        return (), None
+    stats = analytics.rate_stats(code, period.start, period.end, window)
+    averages = dict(zip(stats['dates'], stats['ma']))
+    overlay = [(d, averages[d]) for d, _ in series if averages.get(d) is not None]
+    return overlay, f'Średnia z {window} notowań'
+
+def batch_chart(period, series):
+    return charts.get_batch_chart(period.label, {code: chart_series(rates) for code, rates in series.items()})
 
-    weeks = int(request.args.get('time', 1))
-    end_date = datetime.today().date()
-    start_date = end_date - timedelta(weeks=weeks)
+def refresh_rates(codes, period):
+    # g.stale: pokazujemy ostatnie zapisane dane, bo odświeżenie trwa w tle albo NBP nie odpowiada
+    try:
+        with metrics.stage('sync'):
+            g.stale = not store.refresh(codes, period.start)
+    except nbp.FetchError as e:
+        app.logger.warning(str(e))
+        g.stale = True
 
-    start_str = start_date.strftime('%Y-%m-%d')
-    end_str = end_date.strftime('%Y-%m-%d')
+def load_rates(code, period):
+    refresh_rates([code], period)
+    with metrics.stage('store'):
+        return store.get_rates(code, period.start, period.end)
 
-    url = f'https://api.nbp.pl/api/exchangerates/rates/A/{code}/{start_str}/{end_str}/?format=json'
-    response = requests.get(url)
+def get_table():
+    # zestawienie jednej tabeli NBP naraz: A (codziennie) albo B (raz w tygodniu)
+    table = request.args.get('table', 'A').upper()
+    return table if table in catalog.TABLES else 'A'
+
+def load_all_rates(period, table):
+    codes = catalog.codes(table)
+    refresh_rates(codes, period)
+    with metrics.stage('store'):
+        series = store.get_rates_many(codes, period.start, period.end)
+    return {code: rates for code, rates in series.items() if rates}
+
+# nieaktualne dane przeglądarka może trzymać tylko chwilę, zanim odświeżanie w tle się skończy
+STALE_MAX_AGE = 60
+
+def max_age(period, latest):
+    now = datetime.now()
+    # zakres zakończony w przeszłości już się nie zmieni, bieżący - dopiero po kolejnej publikacji NBP
+    if period.end < now.date():
+        return 24 * 3600
+    # dzisiejsza tabela powinna już być, a jeszcze jej nie mamy - odświeżamy jak lokalną bazę
+    if now.weekday() < 5 and now.time() >= nbp.PUBLISH_TIME and latest < now.date().isoformat():
+        return int(store.SYNC_INTERVAL.total_seconds())
+    return max(60, int((nbp.next_publication(now) - now).total_seconds()))
+
+def latest_date(series):
+    return max(rates[-1][0] for rates in series.values())
+
+def conditional(etag, period, latest, build):
+    stale = g.get('stale', False)
+    if stale:
+        etag = f'{etag}-stale'
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = make_response(build())
+    response.set_etag(etag)
+    response.cache_control.no_cache = None
+    response.cache_control.public = True
+    response.cache_control.max_age = STALE_MAX_AGE if stale else max_age(period, latest)
+    return response
+
+def render_page(template, **context):
+    with metrics.stage('template'):
+        return render_template(template, **context)
+
+def page_etag(data_fingerprint):
+    key = f'{request.full_path}|{data_fingerprint}|{TEMPLATES_VERSION}|{catalog.version()}'
+    return hashlib.sha256(key.encode()).hexdigest()[:16]
+
+def send_export(fmt):
+    code, period = get_params()
+    rates = load_rates(code, period)
+    if not rates:
+        return "Plik nie istnieje", 404
+
+    def build():
+        try:
+            filename = exports.get_export(code, rates, fmt)
+        except exports.ExportUnavailable as e:
+            abort(501, str(e))
+        return send_from_directory(exports.EXPORT_DIR, filename, as_attachment=True, etag=False,
+                                   download_name=f'{code}_data.{fmt}', mimetype=exports.EXPORTS[fmt][1])
+
+    return conditional(filecache.fingerprint(code, fmt, rates), period, rates[-1][0], build)
+
+@app.before_request
+def start_timing():
+    metrics.start_request()
+    g.started = time.perf_counter()
+
+@app.after_request
+def record_timing(response):
+    elapsed = time.perf_counter() - g.started
+    endpoint = request.endpoint or 'none'
+    metrics.inc('http_requests_total', endpoint=endpoint, status=response.status_code)
+    metrics.observe('http_request_duration_seconds', elapsed, endpoint=endpoint)
+    if app.config['SERVER_TIMING']:
+        timings = metrics.request_timings() + [('total', elapsed)]
+        response.headers['Server-Timing'] = metrics.server_timing_header(timings)
+    return response
+
+@app.route('/')
+def index():
+    code, period = get_params()
+    chart_mode = 'js' if request.args.get('mode') == 'js' else 'png'
+    rates = load_rates(code, period)
 
-    if response.status_code != 200:
-        return render_template('index.html', 
-                               tbody_html='', 
+    if not rates:
+        return render_page('index.html', 
+                               rates=[], 
                                chart_img=None, 
                                code=code, 
-                               currencies=CURRENCIES, 
+                               currencies=catalog.names(), 
+                               quote=catalog.get(code),
+                               chart_mode=chart_mode,
+                               ma=get_window(),
+                               windows=analytics.WINDOWS,
+                               downsampling=downsampling_query(),
+                               period=period,
                                error=f"Błąd pobierania danych dla {code}")
 
-    data = response.json()
-    rates = [{'date': r['effectiveDate'], 'mid': r['mid']} for r in data['rates']]
+    def build():
+        chart_file = None
+        if chart_mode == 'png':
+            series = chart_series(rates)
+            chart_file = charts.get_chart(code, period.label, series, *chart_overlay(code, period, series))
+        return render_page('index.html',
+                               rates=rates,
+                               chart_img=chart_file,
+                               code=code,
+                               currencies=catalog.names(),
+                               quote=catalog.get(code),
+                               chart_mode=chart_mode,
+                               ma=get_window(),
+                               windows=analytics.WINDOWS,
+                               downsampling=downsampling_query(),
+                               period=period,
+                               error=None)
 
-    df = pd.DataFrame(rates)
-    df['date'] = pd.to_datetime(df['date'])
+    etag = page_etag(filecache.fingerprint(code, period.label, rates))
+    return conditional(etag, period, rates[-1][0], build)
 
-    excel_path = f'{code}_data.xlsx'
-    df.to_excel(excel_path, index=False)
 
-    img_path = os.path.join('static', 'charts', f'{code}_chart.png')
-    os.makedirs(os.path.dirname(img_path), exist_ok=True)
+@app.route('/api/rates')
+def api_rates():
+    code, period = get_params()
+    rates = load_rates(code, period)
+    if not rates:
+        return jsonify(error=f"Brak danych dla {code}"), 404
 
-    plt.figure(figsize=(12, 6))
-    plt.plot(df['date'], df['mid'], marker='o', linestyle='-', color='b')
+    if 'points' in request.args:
+        rates = chart_series(rates)
 
-    plt.title(f'Kurs {code} - ostatnie {weeks} tygodni')
-    plt.xlabel('Data')
-    plt.ylabel('Kurs (PLN)')
+    def build():
+        return jsonify(code=code,
+                       name=catalog.get(code)['name'],
+                       period=period.label,
+                       start=period.start.isoformat(),
+                       end=period.end.isoformat(),
+                       stale=g.get('stale', False),
+                       rates=[{'date': d, 'mid': mid} for d, mid in rates])
 
-    plt.xticks(rotation=45, ha='right')
+    response = conditional(filecache.fingerprint(code, period.label, rates), period, rates[-1][0], build)
+    response.last_modified = datetime.fromisoformat(rates[-1][0])
+    return response.make_conditional(request)
 
-    plt.grid(True, linestyle='--', alpha=0.7)
 
-    plt.tight_layout()
+@app.route('/api/analytics')
+def api_analytics():
+    code, period = get_params()
+    window = get_window() or analytics.WINDOWS[2]
+    refresh_rates([code], period)
+    stats = analytics.rate_stats(code, period.start, period.end, window)
+    if not stats['dates']:
+        return jsonify(error=f"Brak danych dla {code}"), 404
 
-    plt.savefig(img_path)
-    plt.close()
+    rows = list(zip(stats['dates'], stats['mid'], stats['change'], stats['ma']))
+    if 'points' in request.args:
+        kept = {d for d, _ in chart_series([(d, mid) for d, mid, _, _ in rows])}
+        rows = [row for row in rows if row[0] in kept]
 
-    tbody_html = ''.join(
-        f"<tr><td>{row['date'].date()}</td><td>{row['mid']:.4f}</td></tr>"
-        for _, row in df.iterrows()
-    )
+    def build():
+        return jsonify(code=code,
+                       name=catalog.get(code)['name'],
+                       period=period.label,
+                       start=period.start.isoformat(),
+                       end=period.end.isoformat(),
+                       window=window,
+                       stale=g.get('stale', False),
+                       rates=[{'date': d, 'mid': mid, 'change': change, 'ma': ma}
+                              for d, mid, change, ma in rows])
 
-    return render_template('index.html',
-                           tbody_html=tbody_html,
-                           chart_img=f'charts/{code}_chart.png',
-                           code=code,
-                           currencies=CURRENCIES,
-                           error=None)
+    return conditional(page_etag(stats['etag']), period, stats['dates'][-1], build)
 
 
+def get_codes(name, default=None):
+    value = request.args.get(name, default)
+    if value is None:
+        abort(400, f"Brak parametru {name}")
+    codes = list(dict.fromkeys(code for code in value.upper().split(',') if code))
+    if not codes:
+        abort(400, f"Brak walut w parametrze {name}")
+    unknown = [code for code in codes if catalog.get(code) is None]
+    if unknown:
+        abort(400, f"Nieznana waluta: {', '.join(unknown)}")
+    return codes
+
+def get_code(name):
+    codes = get_codes(name)
+    if len(codes) != 1:
+        abort(400, f"Parametr {name} wymaga dokładnie jednej waluty")
+    return codes[0]
+
+@app.route('/api/cross')
+def api_cross():
+    base = get_code('base')
+    quote = get_code('quote')
+    period = get_period()
+    # base == quote daje kurs 1, ale walutę odświeżamy tylko raz
+    refresh_rates(sorted({base, quote}), period)
+    cross = analytics.cross_rates(base, quote, period.start, period.end)
+    if not cross['dates']:
+        return jsonify(error=f"Brak danych dla {base}/{quote}"), 404
+
+    def build():
+        return jsonify(base=base,
+                       quote=quote,
+                       period=period.label,
+                       stale=g.get('stale', False),
+                       rates=[{'date': d, 'rate': rate} for d, rate in zip(cross['dates'], cross['rate'])])
+
+    return conditional(page_etag(cross['etag']), period, cross['dates'][-1], build)
+
+@app.route('/api/cross/matrix')
+def api_cross_matrix():
+    codes = get_codes('codes', ','.join(catalog.codes('A')))
+    period = get_period()
+    refresh_rates(codes, period)
+    matrix = analytics.cross_matrix(codes, period.start, period.end)
+    if matrix is None:
+        return jsonify(error="Brak wspólnych notowań dla wybranych walut"), 404
+
+    def build():
+        return jsonify(period=period.label,
+                       stale=g.get('stale', False),
+                       **{key: value for key, value in matrix.items() if key != 'etag'})
+
+    return conditional(page_etag(matrix['etag']), period, matrix['last'], build)
+
+
+@app.route('/api/currencies')
+def api_currencies():
+    # lista walut z tabel NBP; bid i ask tylko dla walut z ostatniej tabeli C
+    response = jsonify(version=catalog.version(),
+                       currencies=[dict(code=code, **entry) for code, entry in catalog.current().entries.items()])
+    response.cache_control.max_age = STALE_MAX_AGE
+    return response
+
 @app.route('/download/excel')
 def download_excel():
-    code = request.args.get('currency', 'EUR').upper()
-    filename = f'{code}_data.xlsx'
-    if not os.path.exists(filename):
-        return "Plik nie istnieje", 404
-    return send_from_directory('.', filename, as_attachment=True)
+    return send_export('xlsx')
+
+@app.route('/download/csv')
+def download_csv():
+    return send_export('csv')
+
+@app.route('/download/parquet')
+def download_parquet():
+    return send_export('parquet')
 
 @app.route('/download/chart')
 def download_chart():
-    code = request.args.get('currency', 'EUR').upper()
-    filename = f'{code}_chart.png'
-    filepath = os.path.join('static', 'charts', filename)
-    if not os.path.exists(filepath):
+    code, period = get_params()
+    rates = load_rates(code, period)
+    if not rates:
         return "Plik nie istnieje", 404
-    return send_from_directory('static/charts', filename, as_attachment=True)
+    series = chart_series(rates)
+
+    def build():
+        filename = charts.get_chart(code, period.label, series, *chart_overlay(code, period, series))
+        return send_from_directory(charts.CHART_DIR, filename, as_attachment=True, etag=False,
+                                   download_name=f'{code}_chart.png')
+
+    label = f'{period.label}|ma{get_window()}'
+    return conditional(filecache.fingerprint(code, label, series), period, rates[-1][0], build)
+
+@app.route('/batch')
+def batch():
+    period = get_period()
+    table = get_table()
+    series = load_all_rates(period, table)
+
+    if not series:
+        return render_page('batch.html',
+                               codes=[],
+                               rows=[],
+                               chart_img=None,
+                               currencies=catalog.names(),
+                               table=table,
+                               tables=catalog.TABLES,
+                               period=period,
+                               error="Błąd pobierania danych")
+
+    def build():
+        columns = {code: dict(rates) for code, rates in series.items()}
+        dates = sorted({d for rates in columns.values() for d in rates})
+        rows = [(d, [columns[code].get(d) for code in series]) for d in dates]
+
+        return render_page('batch.html',
+                               codes=list(series),
+                               rows=rows,
+                               chart_img=batch_chart(period, series),
+                               currencies=catalog.names(),
+                               table=table,
+                               tables=catalog.TABLES,
+                               period=period,
+                               error=None)
+
+    etag = page_etag(filecache.series_fingerprint(period.label, series))
+    return conditional(etag, period, latest_date(series), build)
+
+@app.route('/download/batch/excel')
+def download_batch_excel():
+    period = get_period()
+    table = get_table()
+    series = load_all_rates(period, table)
+    if not series:
+        return "Plik nie istnieje", 404
+
+    def build():
+        return send_from_directory(exports.EXPORT_DIR, exports.get_batch_export(series), as_attachment=True,
+                                   etag=False, download_name='kursy_data.xlsx', mimetype=exports.XLSX_MIMETYPE)
+
+    return conditional(filecache.series_fingerprint('xlsx', series), period, latest_date(series), build)
+
+@app.route('/download/batch/chart')
+def download_batch_chart():
+    period = get_period()
+    table = get_table()
+    series = load_all_rates(period, table)
+    if not series:
+        return "Plik nie istnieje", 404
+    reduced = {code: chart_series(rates) for code, rates in series.items()}
+
+    def build():
+        filename = charts.get_batch_chart(period.label, reduced)
+        return send_from_directory(charts.CHART_DIR, filename, as_attachment=True, etag=False,
+                                   download_name='kursy_chart.png')
+
+    return conditional(filecache.series_fingerprint(period.label, reduced), period, latest_date(series), build)
+
+@app.route('/ready')
+def ready():
+    try:
+        store.ping()
+    except Exception as e:
+        return jsonify(status='error', error=str(e)), 503
+    return jsonify(status='ok',
+                   renderer='warm' if renderer.is_warm() else 'cold',
+                   nbp='unavailable' if nbp.breaker_open() else 'ok')
+
+@app.route('/metrics')
+def metrics_view():
+    return app.response_class(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/charts/<filename>')
+def chart_file(filename):
+    response = send_from_directory(charts.CHART_DIR, filename)
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
 
 if __name__ == '__main__':
-    app.run(debug=True, port=1111)
+    app.run(debug=True, port=int(os.environ.get('PORT', 1111)))
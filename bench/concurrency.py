@@ -0,0 +1,33 @@
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import load
+import nbp_stub
+from servers import SERVERS
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Porównanie przepustowości serwerów przy równoległych zapytaniach.')
+    parser.add_argument('--modes', nargs='+', default=['dev', 'waitress'], choices=sorted(SERVERS))
+    parser.add_argument('--requests', type=int, default=300, help='liczba zapytań na każdy adres')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--latency', type=float, default=0.05, help='opóźnienie odpowiedzi zaślepki NBP w sekundach')
+    args = parser.parse_args()
+
+    # ten sam generator obciążenia co bench/load.py, więc wyniki obu narzędzi są porównywalne;
+    # przy zimnej pamięci podręcznej zapytania czekają na wolne NBP, a przy ciepłej tylko na serwer
+    stub = nbp_stub.start(latency=args.latency)
+    print(f"{'serwer':<10} {'pamięć':<8} {load.HEADER}")
+    try:
+        for mode in args.modes:
+            for cache, warm in (('zimna', False), ('ciepła', True)):
+                for path, r in load.measure(mode, stub, args.requests, args.concurrency, warm).items():
+                    print(f"{mode:<10} {cache:<8} {load.row(path, r)}")
+    finally:
+        stub.shutdown()
+
+
+if __name__ == '__main__':
+    main()
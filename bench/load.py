@@ -0,0 +1,100 @@
+import argparse
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import requests
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import nbp_stub
+import results
+from servers import SERVERS, free_port, isolated_env, start_server, stop_server, wait_for_port
+
+PATHS = {
+    '/': '/?currency={code}&time={weeks}',
+    '/download/excel': '/download/excel?currency={code}&time={weeks}',
+    '/download/chart': '/download/chart?currency={code}&time={weeks}',
+}
+CODES = ['USD', 'EUR', 'GBP', 'CHF', 'JPY']
+
+HEADER = f"{'adres':<18} {'zap./s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'błędy':>6}"
+
+
+def percentile(sorted_values, p):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+
+def summarize(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    return {
+        'rps': len(latencies) / elapsed,
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'errors': errors,
+    }
+
+
+def row(path, r):
+    return (f"{path:<18} {r['rps']:>8.1f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} "
+            f"{r['p99_ms']:>8.1f} {r['errors']:>6}")
+
+
+def run_path(base, template, count, concurrency):
+    session = requests.Session()
+    urls = [base + template.format(code=CODES[i % len(CODES)], weeks=i % 8 + 1) for i in range(count)]
+
+    def hit(url):
+        t = time.perf_counter()
+        status = session.get(url, timeout=60).status_code
+        return time.perf_counter() - t, status
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        samples = list(pool.map(hit, urls))
+    elapsed = time.perf_counter() - started
+    return summarize([t for t, _ in samples], sum(1 for _, s in samples if s != 200), elapsed)
+
+
+def measure(mode, stub, count, concurrency, warm=True):
+    port = free_port()
+    process = start_server(mode, port, env=isolated_env(stub))
+    base = f'http://127.0.0.1:{port}'
+    try:
+        wait_for_port(port)
+        # rozgrzewka: zapełnia lokalną bazę, żeby mierzyć serwer, a nie NBP;
+        # bez niej pierwsze zapytania czekają na zaślepkę NBP (pomiar z zimną pamięcią podręczną)
+        for code in CODES if warm else []:
+            requests.get(f'{base}/?currency={code}&time=8&mode=js', timeout=60)
+        return {path: run_path(base, template, count, concurrency) for path, template in PATHS.items()}
+    finally:
+        stop_server(process)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Test obciążenia /, /download/excel i /download/chart z lokalną zaślepką NBP.')
+    parser.add_argument('--mode', default='waitress', choices=sorted(SERVERS))
+    parser.add_argument('--requests', type=int, default=400, help='liczba zapytań na każdy adres')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--latency', type=float, default=0.05, help='opóźnienie odpowiedzi zaślepki NBP w sekundach')
+    parser.add_argument('--output', type=Path, help='plik z wynikami (domyślnie bench/results/load-<rewizja>.json)')
+    args = parser.parse_args()
+
+    stub = nbp_stub.start(latency=args.latency)
+    try:
+        print(HEADER)
+        measured = measure(args.mode, stub, args.requests, args.concurrency)
+        for path, r in measured.items():
+            print(row(path, r))
+    finally:
+        stub.shutdown()
+
+    settings = {'mode': args.mode, 'requests': args.requests, 'concurrency': args.concurrency,
+                'latency': args.latency}
+    print(f"Zapisano: {results.save('load', measured, args.output, settings)}")
+
+
+if __name__ == '__main__':
+    main()
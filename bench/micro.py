@@ -0,0 +1,94 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import nbp_stub
+import results
+from servers import ROOT, isolated_env
+
+# zakresy jak z formularza: krótki (domyślny widok) i długi, przy którym działa redukcja punktów
+RANGES = {
+    '8 tygodni': 'time=8',
+    '5 lat': 'years=5',
+}
+
+
+def measure(fn, repeat, min_time=0.2):
+    fn()
+    samples = []
+    started = time.perf_counter()
+    while len(samples) < repeat or time.perf_counter() - started < min_time:
+        t = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t)
+    return {
+        'median_ms': statistics.median(samples) * 1000,
+        'min_ms': min(samples) * 1000,
+        'runs': len(samples),
+    }
+
+
+def stages(app, code, query):
+    import downsample
+    import exports
+    import nbp
+    import renderer
+    import store
+
+    with app.app.test_request_context(f'/?currency={code}&{query}'):
+        _, period = app.get_params()
+    store.sync(code, period.start)
+    rates = store.get_rates(code, period.start, period.end)
+    raw = json.dumps(nbp_stub.load().rates_body('A', code, period.start, period.end)).encode()
+    series = downsample.reduce(rates)
+
+    def template():
+        with app.app.test_request_context(f'/?currency={code}&{query}'):
+            app.render_page('index.html', rates=rates, chart_img='chart.png', code=code,
+                            currencies=app.catalog.names(), chart_mode='png', period=period, error=None)
+
+    return len(rates), {
+        'parse': lambda: nbp.parse_rates(json.loads(raw)),
+        'store': lambda: store.get_rates(code, period.start, period.end),
+        'downsample': lambda: downsample.reduce(rates),
+        'excel': lambda: exports.excel_bytes(rates),
+        'chart': lambda: renderer.render_png(f'Kurs {code} - {period.label}', series),
+        'template': template,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pomiar czasu poszczególnych etapów obsługi strony głównej.')
+    parser.add_argument('--currency', default='EUR')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--only', nargs='+', help='mierzy tylko wybrane etapy')
+    parser.add_argument('--output', type=Path, help='plik z wynikami (domyślnie bench/results/micro-<rewizja>.json)')
+    args = parser.parse_args()
+
+    stub = nbp_stub.start()
+    # osobna baza i katalogi plików, żeby pomiar nie zależał od stanu lokalnej pamięci podręcznej
+    os.environ.update(isolated_env(stub), RENDER_WORKERS='0')
+    sys.path.insert(0, str(ROOT))
+    import app
+
+    measured = {}
+    print(f"{'etap':<12} {'zakres':<10} {'punkty':>7} {'mediana ms':>11} {'min ms':>8}")
+    for label, query in RANGES.items():
+        points, fns = stages(app, args.currency, query)
+        for stage, fn in fns.items():
+            if args.only and stage not in args.only:
+                continue
+            r = measured.setdefault(stage, {})[label] = measure(fn, args.repeat)
+            print(f"{stage:<12} {label:<10} {points:>7} {r['median_ms']:>11.2f} {r['min_ms']:>8.2f}")
+
+    print(f"Zapisano: {results.save('micro', measured, args.output, {'currency': args.currency})}")
+    stub.shutdown()
+
+
+if __name__ == '__main__':
+    main()
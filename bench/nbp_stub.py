@@ -0,0 +1,212 @@
+"""Lokalna zaślepka API NBP do testów i pomiarów.
+
+W repozytorium nie ma nagrania (bench/fixtures/table_a.json), więc domyślnie wszystkie tabele są syntetyczne:
+tabela A to powtarzalne kursy 10 walut, tabele B i C są zawsze wyliczane. Nagranie prawdziwej tabeli A
+tworzy --record; jeśli plik istnieje, tabela A jest odtwarzana z niego.
+"""
+import argparse
+import json
+import math
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+RECORDING = Path(__file__).resolve().parent / 'fixtures' / 'table_a.json'
+
+RATES_PATH = re.compile(r'^/api/exchangerates/rates/(\w)/(\w{3})/(\d{4}-\d\d-\d\d)/(\d{4}-\d\d-\d\d)/?$')
+TABLES_PATH = re.compile(r'^/api/exchangerates/tables/(\w)/(\d{4}-\d\d-\d\d)/(\d{4}-\d\d-\d\d)/?$')
+LAST_TABLE_PATH = re.compile(r'^/api/exchangerates/tables/(\w)/?$')
+
+SYNTHETIC_CODES = ['USD', 'EUR', 'DKK', 'GBP', 'CHF', 'JPY', 'CAD', 'AUD', 'NOK', 'CZK']
+# tabela B (w środy) ma ponad sto walut, razem z tabelą A około 150 pozycji w katalogu
+TABLE_B_CODES = '''AFN MGA PAB ETB VES BOB CRC SVC NIO GMD MKD DZD BHD IQD JOD KWD LYD RSD TND MAD AED STN BSD BBD BZD
+BND FJD GYD JMD LRD NAD SRD TTD XCD SBD ZWL VND AMD CVE AWG BIF XOF XAF XPF DJF GNF KMF CDF RWF EGP GIP LBP SSP SDG
+SYP GHS HTG PYG ANG PGK LAK MWK ZMW AOA MMK GEL MDL ALL HNL SLE SZL LSL AZN MZN NGN ERN TWD TMT MRU TOP MOP ARS DOP
+COP CUP UYU BWP GTQ IRR YER QAR OMR SAR KHR BYN LKR MVR MUR NPR PKR SCR PEN KGS TJS UZS KES SOS TZS UGX BDT WST KZT
+MNT VUV BAM'''.split()
+# tabela C: kursy kupna i sprzedaży dla części walut z tabeli A
+TABLE_C_CODES = 13
+SPREAD = 0.01
+
+
+def synthetic():
+    # bez nagrania: powtarzalne kursy z okresem roku, żeby każde uruchomienie dawało te same dane
+    dates = [d.isoformat() for d in business_days(date(2024, 1, 1), date(2024, 12, 31))]
+    rates = {}
+    for i, code in enumerate(SYNTHETIC_CODES):
+        base = 0.03 if code == 'JPY' else 0.6 + i * 0.45
+        rates[code] = [round(base * (1 + 0.05 * math.sin(n / 40 + i) + 0.01 * math.sin(n / 3)), 4)
+                       for n in range(len(dates))]
+    return {'dates': dates, 'rates': rates}
+
+
+def business_days(start, end):
+    d = start
+    while d <= end:
+        if d.weekday() < 5:
+            yield d
+        d += timedelta(days=1)
+
+
+class Replay:
+    def __init__(self, recording):
+        self.dates = recording['dates']
+        self.rates = recording['rates']
+
+    def mids(self, d, table='A'):
+        if table == 'B':
+            n = d.toordinal() // 7
+            return {code: round(0.05 + i * 0.07 + 0.002 * math.sin(n / 5 + i), 4)
+                    for i, code in enumerate(TABLE_B_CODES)}
+        # dowolna data dostaje notowanie z nagrania, kolejne dni robocze idą po kolei w pętli
+        n = d.toordinal() - 1
+        i = (n // 7 * 5 + min(n % 7, 5)) % len(self.dates)
+        return {code: values[i] for code, values in self.rates.items()}
+
+    def days(self, table, start, end):
+        return [d for d in business_days(start, end) if table != 'B' or d.weekday() == 2]
+
+    def rates_body(self, table, code, start, end):
+        if code not in self.mids(start, table):
+            return None
+        rates = [{'no': _table_no(table, d), 'effectiveDate': d.isoformat(), 'mid': self.mids(d, table)[code]}
+                 for d in self.days(table, start, end)]
+        if not rates:
+            return None
+        return {'table': table, 'currency': code.lower(), 'code': code, 'rates': rates}
+
+    def _table_rates(self, table, d):
+        if table == 'C':
+            return [{'currency': code.lower(), 'code': code,
+                     'bid': round(mid * (1 - SPREAD), 4), 'ask': round(mid * (1 + SPREAD), 4)}
+                    for code, mid in list(self.mids(d).items())[:TABLE_C_CODES]]
+        return [{'currency': code.lower(), 'code': code, 'mid': mid} for code, mid in self.mids(d, table).items()]
+
+    def tables_body(self, table, start, end):
+        tables = [{'table': table, 'no': _table_no(table, d), 'effectiveDate': d.isoformat(),
+                   'rates': self._table_rates(table, d)}
+                  for d in self.days(table, start, end)]
+        return tables or None
+
+    def last_table_body(self, table, today):
+        return (self.tables_body(table, today - timedelta(days=6), today) or [])[-1:] or None
+
+
+def _table_no(table, d):
+    return f'{d.timetuple().tm_yday:03d}/{table}/NBP/{d.year}'
+
+
+def load(path=RECORDING):
+    if path.exists():
+        return Replay(json.loads(path.read_text()))
+    return Replay(synthetic())
+
+
+def handler(replay, latency):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            path = self.path.split('?')[0]
+            with self.server.lock:
+                self.server.hits[path] += 1
+                failing = self.server.failures > 0
+                self.server.failures -= failing
+            if latency:
+                time.sleep(latency)
+            if failing:
+                self.send_response(503)
+                self.end_headers()
+                return
+            body = self.route(path)
+            if body is None:
+                self.send_response(404)
+                self.end_headers()
+                self.wfile.write(b'404 NotFound - Not Found - Brak danych')
+                return
+
+            data = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def route(self, path):
+            if m := RATES_PATH.match(path):
+                table, code, start, end = m.groups()
+                return replay.rates_body(table, code, date.fromisoformat(start), date.fromisoformat(end))
+            if m := TABLES_PATH.match(path):
+                table, start, end = m.groups()
+                return replay.tables_body(table, date.fromisoformat(start), date.fromisoformat(end))
+            if m := LAST_TABLE_PATH.match(path):
+                return replay.last_table_body(m.group(1), date.today())
+            return None
+
+    return Handler
+
+
+def serve(port, latency, recording=RECORDING, failures=0):
+    # hits: liczba zapytań pod każdy adres; failures: tyle pierwszych zapytań dostaje 503 (awaria NBP)
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler(load(recording), latency))
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.hits = Counter()
+    server.failures = failures
+    return server
+
+
+def start(port=0, latency=0.0, recording=RECORDING, failures=0):
+    server = serve(port, latency, recording, failures)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def url(server):
+    return f'http://127.0.0.1:{server.server_address[1]}/api'
+
+
+def record(start_date, end_date, path=RECORDING):
+    sys.path.insert(0, str(ROOT))
+    import nbp
+
+    table = nbp.get_table('A', start_date, end_date)
+    codes = sorted(set.intersection(*(set(mids) for _, mids in table)))
+    recording = {
+        'dates': [d for d, _ in table],
+        'rates': {code: [mids[code] for _, mids in table] for code in codes},
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(recording, indent=1))
+    return len(table), len(codes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Lokalna zaślepka API NBP: dane syntetyczne, a tabela A z nagrania, jeśli je zrobiono (--record).')
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--latency', type=float, default=0.0, help='sztuczne opóźnienie odpowiedzi w sekundach')
+    parser.add_argument('--record', action='store_true',
+                        help=f'pobiera notowania z prawdziwego API NBP do {RECORDING.relative_to(ROOT)}')
+    parser.add_argument('--start', type=date.fromisoformat, default=date(2024, 1, 1))
+    parser.add_argument('--end', type=date.fromisoformat, default=date(2024, 12, 31))
+    args = parser.parse_args()
+
+    if args.record:
+        days, codes = record(args.start, args.end)
+        print(f"Nagrano {days} tabel, {codes} walut")
+        return
+
+    source = 'nagranie' if RECORDING.exists() else 'dane syntetyczne'
+    print(f"Zaślepka NBP ({source}): http://127.0.0.1:{args.port}/api")
+    serve(args.port, args.latency).serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / 'results'
+
+
+def _git(*args):
+    try:
+        return subprocess.run(['git', *args], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def metadata():
+    return {
+        'revision': _git('rev-parse', '--short', 'HEAD'),
+        'dirty': bool(_git('status', '--porcelain', '--untracked-files=no')),
+        'time': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def save(kind, results, path=None, settings=None):
+    meta = metadata()
+    if path is None:
+        suffix = '-dirty' if meta['dirty'] else ''
+        path = RESULTS_DIR / f"{kind}-{meta['revision'] or 'norev'}{suffix}.json"
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({'kind': kind, **meta, 'settings': settings or {}, 'results': results}, indent=1))
+    return path
+
+
+def _flatten(results, prefix=''):
+    for key, value in results.items():
+        if isinstance(value, dict):
+            yield from _flatten(value, f'{prefix}{key} ')
+        elif isinstance(value, (int, float)):
+            yield f'{prefix}{key}', value
+
+
+def compare(before, after):
+    old = dict(_flatten(before['results']))
+    new = dict(_flatten(after['results']))
+    if before['settings'] != after['settings']:
+        print(f"Uwaga: różne ustawienia pomiarów: {before['settings']} i {after['settings']}")
+    print(f"{'pomiar':<40} {before['revision'] or '-':>10} {after['revision'] or '-':>10} {'zmiana':>8}")
+    for key in (k for k in old if k in new):
+        change = f'{(new[key] - old[key]) / old[key] * 100:+.1f}%' if old[key] else ''
+        print(f'{key:<40} {old[key]:>10.2f} {new[key]:>10.2f} {change:>8}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Porównanie dwóch zapisanych wyników pomiarów.')
+    parser.add_argument('before', type=Path)
+    parser.add_argument('after', type=Path)
+    args = parser.parse_args()
+
+    before, after = (json.loads(p.read_text()) for p in (args.before, args.after))
+    if before['kind'] != after['kind']:
+        sys.exit(f"Różne rodzaje pomiarów: {before['kind']} i {after['kind']}")
+    compare(before, after)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import nbp_stub
+
+ROOT = Path(__file__).resolve().parent.parent
+
+SERVERS = {
+    'dev': lambda port: [sys.executable, str(ROOT / 'app.py')],
+    'waitress': lambda port: [sys.executable, str(ROOT / 'serve.py'), '--port', str(port)],
+    'gunicorn': lambda port: [sys.executable, str(ROOT / 'serve.py'), '--port', str(port), '--workers', '4'],
+}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with socket.socket() as s:
+            if s.connect_ex(('127.0.0.1', port)) == 0:
+                return
+        time.sleep(0.05)
+    raise RuntimeError(f"Serwer nie wystartował na porcie {port}")
+
+
+def start_server(mode, port, env=None):
+    env = dict(os.environ, **(env or {}), PORT=str(port))
+    return subprocess.Popen(
+        SERVERS[mode](port),
+        cwd=ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        preexec_fn=os.setsid if os.name != 'nt' else None,
+        creationflags=subprocess.CREATE_NEW_PROCESS_GROUP if os.name == 'nt' else 0
+    )
+
+
+def stop_server(process):
+    if os.name == 'nt':
+        process.send_signal(signal.CTRL_BREAK_EVENT)
+    else:
+        os.killpg(os.getpgid(process.pid), signal.SIGTERM)
+    process.wait(timeout=10)
+
+
+def isolated_env(stub):
+    # pusta baza i pamięć podręczna przy każdym uruchomieniu, żeby wyniki z różnych rewizji dało się porównać;
+    # zaślepka NBP zamiast sieci, a rates.db i static/charts w repozytorium zostają nietknięte
+    workdir = Path(tempfile.mkdtemp(prefix='bench-'))
+    return {
+        'NBP_API_URL': nbp_stub.url(stub),
+        'RATES_DB': str(workdir / 'rates.db'),
+        'CHART_DIR': str(workdir / 'charts'),
+        'EXPORT_DIR': str(workdir / 'exports'),
+        'CATALOG_PATH': str(workdir / 'catalog.json'),
+    }
@@ -0,0 +1,60 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+import requests
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import nbp_stub
+from servers import ROOT, SERVERS, free_port, isolated_env, start_server, stop_server
+
+
+def import_time(stub):
+    # import app zakłada bazę, więc też w katalogu tymczasowym, a nie w rates.db repozytorium
+    env = dict(os.environ, **isolated_env(stub))
+    started = time.perf_counter()
+    subprocess.run([sys.executable, '-c', 'import app'], cwd=ROOT, env=env, check=True)
+    return time.perf_counter() - started
+
+
+def time_to_ready(mode, stub, timeout=60):
+    port = free_port()
+    started = time.perf_counter()
+    process = start_server(mode, port, env=isolated_env(stub))
+    try:
+        deadline = started + timeout
+        while time.perf_counter() < deadline:
+            try:
+                if requests.get(f'http://127.0.0.1:{port}/ready', timeout=1).status_code == 200:
+                    return time.perf_counter() - started
+            except requests.RequestException:
+                pass
+            time.sleep(0.01)
+        raise RuntimeError(f"Serwer {mode} nie był gotowy po {timeout} s")
+    finally:
+        stop_server(process)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pomiar czasu importu aplikacji i startu serwera do /ready.')
+    parser.add_argument('--modes', nargs='+', default=['dev', 'waitress'], choices=sorted(SERVERS))
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    # każdy pomiar z pustą bazą i zaślepką NBP, żeby wynik nie zależał od stanu lokalnych plików ani od sieci
+    stub = nbp_stub.start()
+    try:
+        samples = [import_time(stub) for _ in range(args.repeat)]
+        print(f"{'import app':<16} {statistics.median(samples) * 1000:>8.0f} ms (mediana z {args.repeat})")
+        for mode in args.modes:
+            samples = [time_to_ready(mode, stub) for _ in range(args.repeat)]
+            print(f"{'start ' + mode:<16} {statistics.median(samples) * 1000:>8.0f} ms (mediana z {args.repeat})")
+    finally:
+        stub.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+import argparse
+import logging
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from datetime import date, timedelta
+import catalog
+import exports
+import nbp
+import store
+
+WORKERS = 4
+
+log = logging.getLogger('bulk_export')
+
+
+def _sync(code, start, force):
+    try:
+        store.sync(code, start, force=force)
+    except nbp.FetchError as e:
+        return e
+    return None
+
+
+def _open(stack, formats, output, name):
+    return [stack.enter_context(exports.stream(fmt, os.path.join(output, f'{name}.{fmt}'))) for fmt in formats]
+
+
+def export(codes, start, end, formats, output, name='kursy', split=False, workers=WORKERS, force=False):
+    os.makedirs(output, exist_ok=True)
+    failed = []
+
+    with ExitStack() as stack:
+        outs = [] if split else _open(stack, formats, output, name)
+        with ThreadPoolExecutor(workers) as pool:
+            # wyniki przychodzą w kolejności walut: jedna jest zapisywana, a kolejne pobierane w tym czasie
+            results = pool.map(lambda code: _sync(code, start, force), codes)
+            for code, error in zip(codes, results):
+                if error is not None:
+                    log.warning("%s: nie udało się pobrać kursów z NBP, pomijam: %s", code, error)
+                    failed.append(code)
+                    continue
+
+                with ExitStack() as files:
+                    targets = _open(files, formats, output, code) if split else outs
+                    count = 0
+                    for chunk in store.iter_rates(code, start, end):
+                        for out in targets:
+                            out.write(code, chunk)
+                        count += len(chunk)
+                log.info("%s: %d notowań", code, count)
+
+    return failed
+
+
+def _codes(value, table):
+    if value:
+        codes = list(dict.fromkeys(code for code in value.upper().split(',') if code))
+        unknown = [code for code in codes if catalog.get(code) is None]
+        if unknown:
+            raise ValueError(f"Nieznana waluta: {', '.join(unknown)}")
+        return codes
+    return catalog.codes(table)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Pobiera kursy wielu walut za dowolny zakres i zapisuje je do plików Parquet, CSV.gz lub Excel.')
+    parser.add_argument('--codes', help='waluty po przecinku, np. EUR,USD (domyślnie wszystkie z listy NBP)')
+    parser.add_argument('--table', choices=catalog.TABLES, help='tylko waluty z tej tabeli NBP')
+    parser.add_argument('--start', type=date.fromisoformat, help='początek zakresu (RRRR-MM-DD)')
+    parser.add_argument('--end', type=date.fromisoformat, help='koniec zakresu (RRRR-MM-DD), domyślnie dziś')
+    parser.add_argument('--years', type=int, help='zamiast --start: liczba lat wstecz (domyślnie cała historia od 2002)')
+    parser.add_argument('--format', nargs='+', default=['parquet'], choices=sorted(exports.STREAMS), dest='formats')
+    parser.add_argument('--output', default='.', help='katalog na pliki, domyślnie bieżący')
+    parser.add_argument('--name', default='kursy', help='nazwa pliku bez rozszerzenia, domyślnie %(default)s')
+    parser.add_argument('--split', action='store_true', help='osobny plik dla każdej waluty (<KOD>.<format>)')
+    parser.add_argument('--workers', type=int, default=WORKERS, help='ile walut pobierać naraz')
+    parser.add_argument('--force', action='store_true', help='sprawdza w NBP najnowsze notowania mimo świeżych danych')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+    end = min(args.end or date.today(), date.today())
+    if args.start:
+        start = args.start
+    elif args.years:
+        start = end - timedelta(days=round(365.25 * args.years))
+    else:
+        start = nbp.FIRST_DATE
+    start = max(start, nbp.FIRST_DATE)
+    if start > end:
+        parser.error("Data początkowa jest późniejsza niż końcowa")
+
+    try:
+        catalog.refresh()
+    except (nbp.FetchError, OSError) as e:
+        log.warning("Nie udało się odświeżyć listy walut, zostaje zapisana: %s", e)
+    try:
+        codes = _codes(args.codes, args.table)
+    except ValueError as e:
+        parser.error(str(e))
+
+    log.info("Eksport %d walut za okres %s - %s", len(codes), start, end)
+    try:
+        failed = export(codes, start, end, args.formats, args.output, args.name, args.split, args.workers, args.force)
+    except exports.ExportUnavailable as e:
+        parser.error(str(e))
+    if failed:
+        log.error("Bez danych: %s", ', '.join(failed))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
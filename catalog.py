@@ -0,0 +1,164 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from datetime import datetime, timedelta
+import filecache
+import nbp
+
+CATALOG_PATH = os.environ.get('CATALOG_PATH', os.path.join(filecache.ROOT, 'cache', 'catalog.json'))
+REFRESH_INTERVAL = timedelta(hours=float(os.environ.get('CATALOG_REFRESH_HOURS', 12)))
+RETRY_INTERVAL = timedelta(minutes=15)
+
+# tabela A: kursy średnie walut wymienialnych (codziennie), B: pozostałych walut (w środy),
+# C: kursy kupna i sprzedaży części walut z tabeli A
+TABLES = ('A', 'B')
+
+# dopóki lista walut nie zostanie pobrana z NBP; wszystkie są w tabeli A
+DEFAULT = {
+    'USD': 'Dolar amerykański',
+    'EUR': 'Euro',
+    'DKK': 'Korona duńska',
+    'GBP': 'Funt brytyjski',
+    'CHF': 'Frank szwajcarski',
+    'JPY': 'Jen japoński',
+    'CAD': 'Dolar kanadyjski',
+    'AUD': 'Dolar australijski',
+    'NOK': 'Korona norweska',
+    'CZK': 'Korona czeska'
+}
+
+log = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_refreshing = False
+_state = None
+
+
+class _State:
+    def __init__(self, entries, checked):
+        self.entries = entries
+        self.checked = checked
+        self.names = {code: entry['name'] for code, entry in entries.items()}
+        self.by_table = {table: [code for code, entry in entries.items() if entry['table'] == table]
+                         for table in TABLES}
+        digest = hashlib.sha256(json.dumps(entries, sort_keys=True).encode())
+        self.version = digest.hexdigest()[:8]
+
+
+def _default():
+    return {code: {'name': name, 'table': 'A'} for code, name in DEFAULT.items()}
+
+
+def _capitalize(name):
+    return name[:1].upper() + name[1:]
+
+
+def fetch():
+    entries = {}
+    for table in TABLES:
+        for t in (nbp.get_json(f'exchangerates/tables/{table}') or [])[-1:]:
+            for r in t['rates']:
+                # kilka kodów bywa w obu tabelach, wtedy zostaje codzienna tabela A
+                entries.setdefault(r['code'], {'name': _capitalize(r['currency']), 'table': table})
+
+    for t in (nbp.get_json('exchangerates/tables/C') or [])[-1:]:
+        for r in t['rates']:
+            if r['code'] in entries:
+                entries[r['code']].update(bid=r['bid'], ask=r['ask'], quoted=t['effectiveDate'])
+
+    # kolejność na liście wyboru: najpierw tabela A, w obu alfabetycznie
+    return dict(sorted(entries.items(), key=lambda item: (item[1]['table'], item[0])))
+
+
+def _read():
+    try:
+        with open(CATALOG_PATH, encoding='utf-8') as f:
+            data = json.load(f)
+        return _State(data['currencies'], datetime.fromisoformat(data['checked']))
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _write(state):
+    os.makedirs(os.path.dirname(CATALOG_PATH), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(CATALOG_PATH), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'checked': state.checked.isoformat(), 'currencies': state.entries}, f, ensure_ascii=False)
+        os.replace(tmp_path, CATALOG_PATH)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def refresh():
+    global _state
+    entries = fetch()
+    if not entries:
+        raise nbp.FetchError("NBP nie zwróciło żadnej tabeli kursów")
+    state = _State(entries, datetime.now())
+    _write(state)
+    with _lock:
+        _state = state
+    log.info("Lista walut z NBP: %d pozycji", len(entries))
+    return state
+
+
+def _refresh_in_background():
+    global _refreshing, _state
+    try:
+        # inny proces (np. warm.py albo drugi proces serwera) mógł już odświeżyć plik
+        state = _read()
+        if state is None or datetime.now() - state.checked >= REFRESH_INTERVAL:
+            state = refresh()
+        with _lock:
+            _state = state
+    except (nbp.FetchError, OSError, KeyError, ValueError) as e:
+        log.warning("Nie udało się odświeżyć listy walut: %r", e)
+        with _lock:
+            # kolejna próba za RETRY_INTERVAL, a do tego czasu zostaje dotychczasowa lista
+            _state = _State(_state.entries, datetime.now() - REFRESH_INTERVAL + RETRY_INTERVAL)
+    finally:
+        with _lock:
+            _refreshing = False
+
+
+def current():
+    # wywoływane przy każdym zapytaniu: tylko odczyt z pamięci, NBP odpytywane jest w tle
+    global _state, _refreshing
+    with _lock:
+        if _state is None:
+            _state = _read() or _State(_default(), datetime.min)
+        state = _state
+        expired = datetime.now() - state.checked >= REFRESH_INTERVAL
+        start = expired and not _refreshing
+        if start:
+            _refreshing = True
+    if start:
+        threading.Thread(target=_refresh_in_background, daemon=True).start()
+    return state
+
+
+def get(code):
+    return current().entries.get(code)
+
+
+def names():
+    return current().names
+
+
+def table(code):
+    entry = current().entries.get(code)
+    return entry['table'] if entry else 'A'
+
+
+def codes(table=None):
+    state = current()
+    return list(state.names) if table is None else state.by_table[table]
+
+
+def version():
+    return current().version
@@ -0,0 +1,31 @@
+import os
+import filecache
+import renderer
+
+CHART_DIR = os.environ.get('CHART_DIR', os.path.join(filecache.ROOT, 'static', 'charts'))
+MAX_FILES = int(os.environ.get('CHART_CACHE_MAX_FILES', 2000))
+MAX_BYTES = int(os.environ.get('CHART_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+
+
+def chart_filename(code, label, rates, overlay=(), overlay_label=None):
+    if overlay:
+        label = f'{label}|{filecache.fingerprint(code, overlay_label, overlay)}'
+    return f'{code}_{filecache.fingerprint(code, label, rates)}.png'
+
+
+def _cached(filename, render):
+    return filecache.cached(CHART_DIR, filename, render, MAX_FILES, MAX_BYTES)
+
+
+def get_chart(code, label, rates, overlay=(), overlay_label=None):
+    return _cached(
+        chart_filename(code, label, rates, overlay, overlay_label),
+        lambda: renderer.render_png(f'Kurs {code} - {label}', rates, overlay, overlay_label)
+    )
+
+
+def get_batch_chart(label, series):
+    return _cached(
+        f'ALL_{filecache.series_fingerprint(label, series)}.png',
+        lambda: renderer.render_multi_png(f'Kursy walut - {label}', series)
+    )
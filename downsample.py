@@ -0,0 +1,75 @@
+from datetime import date
+
+# wykres ma 1200 pikseli szerokości, więcej niż punkt na dwa piksele i tak się zlewa
+DEFAULT_POINTS = 600
+MIN_POINTS = 3
+
+
+def _x(d):
+    return date.fromisoformat(d).toordinal()
+
+
+def lttb(rates, threshold):
+    n = len(rates)
+    if threshold >= n or threshold < MIN_POINTS:
+        return list(rates)
+
+    xs = [_x(d) for d, _ in rates]
+    ys = [mid for _, mid in rates]
+
+    sampled = [rates[0]]
+    bucket_size = (n - 2) / (threshold - 2)
+    a = 0
+
+    for i in range(threshold - 2):
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+
+        next_start = end
+        next_end = min(int((i + 2) * bucket_size) + 1, n)
+        count = next_end - next_start
+        avg_x = sum(xs[next_start:next_end]) / count
+        avg_y = sum(ys[next_start:next_end]) / count
+
+        ax, ay = xs[a], ys[a]
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+
+        sampled.append(rates[best])
+        a = best
+
+    sampled.append(rates[-1])
+    return sampled
+
+
+def minmax(rates, threshold):
+    n = len(rates)
+    if threshold >= n or threshold < MIN_POINTS:
+        return list(rates)
+
+    # każdy przedział daje dwa punkty, a pierwszy i ostatni są zawsze, więc razem najwyżej threshold
+    buckets = (threshold - 2) // 2
+    bucket_size = (n - 2) / max(buckets, 1)
+    picked = {0, n - 1}
+    for i in range(buckets):
+        start = int(i * bucket_size) + 1
+        end = max(start + 1, int((i + 1) * bucket_size) + 1)
+        indices = range(start, min(end, n - 1))
+        if indices:
+            picked.add(min(indices, key=lambda j: rates[j][1]))
+            picked.add(max(indices, key=lambda j: rates[j][1]))
+    return [rates[j] for j in sorted(picked)]
+
+
+METHODS = {
+    'lttb': lttb,
+    'minmax': minmax,
+    'none': lambda rates, threshold: list(rates),
+}
+
+
+def reduce(rates, method='lttb', points=DEFAULT_POINTS):
+    return METHODS[method](rates, points)
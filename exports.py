@@ -0,0 +1,194 @@
+import csv
+import gzip
+import io
+import os
+from contextlib import contextmanager, suppress
+from datetime import date
+import filecache
+
+EXPORT_DIR = os.environ.get('EXPORT_DIR', os.path.join(filecache.ROOT, 'cache', 'exports'))
+MAX_FILES = int(os.environ.get('EXPORT_CACHE_MAX_FILES', 5000))
+MAX_BYTES = int(os.environ.get('EXPORT_CACHE_MAX_BYTES', 500 * 1024 * 1024))
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+# tyle wierszy naraz trafia do jednej grupy w pliku Parquet przy zapisie strumieniowym
+ROW_GROUP = 100_000
+
+
+class ExportUnavailable(Exception):
+    pass
+
+
+def _append_rates(ws, rates):
+    ws.append(['date', 'mid'])
+    for d, mid in rates:
+        ws.append([date.fromisoformat(d), mid])
+
+
+def _workbook_bytes(wb):
+    buf = io.BytesIO()
+    wb.save(buf)
+    buf.seek(0)
+    return buf
+
+
+def _workbook():
+    # openpyxl ładuje się długo, a większość wejść na stronę nic nie pobiera
+    from openpyxl import Workbook
+    return Workbook(write_only=True)
+
+
+def excel_bytes(rates):
+    wb = _workbook()
+    _append_rates(wb.create_sheet(), rates)
+    return _workbook_bytes(wb)
+
+
+def batch_excel_bytes(series):
+    wb = _workbook()
+    for code, rates in series.items():
+        _append_rates(wb.create_sheet(title=code), rates)
+    return _workbook_bytes(wb)
+
+
+def csv_bytes(rates):
+    text = io.StringIO()
+    writer = csv.writer(text, lineterminator='\n')
+    writer.writerow(['date', 'mid'])
+    writer.writerows(rates)
+    return io.BytesIO(text.getvalue().encode('utf-8'))
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ExportUnavailable("Eksport do Parquet wymaga pakietu pyarrow") from e
+    return pyarrow, pyarrow.parquet
+
+
+def parquet_bytes(rates):
+    pa, pq = _pyarrow()
+    table = pa.table({
+        'date': pa.array([date.fromisoformat(d) for d, _ in rates], type=pa.date32()),
+        'mid': pa.array([mid for _, mid in rates], type=pa.float64()),
+    })
+    buf = io.BytesIO()
+    pq.write_table(table, buf, compression='snappy')
+    buf.seek(0)
+    return buf
+
+
+EXPORTS = {
+    'xlsx': (excel_bytes, XLSX_MIMETYPE),
+    'csv': (csv_bytes, 'text/csv'),
+    'parquet': (parquet_bytes, 'application/vnd.apache.parquet'),
+}
+
+
+
+# zapis strumieniowy dla python3 bulk_export.py: kursy dopisywane są porcjami, waluta po walucie,
+# więc w pamięci jest najwyżej jedna porcja (albo jedna grupa wierszy Parquet)
+class CsvGzStream:
+    def __init__(self, path):
+        self.file = gzip.open(path, 'wt', encoding='utf-8', newline='')
+        self.writer = csv.writer(self.file, lineterminator='\n')
+        self.writer.writerow(['code', 'date', 'mid'])
+
+    def write(self, code, rows):
+        self.writer.writerows((code, d, mid) for d, mid in rows)
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetStream:
+    def __init__(self, path):
+        self.pa, pq = _pyarrow()
+        self.schema = self.pa.schema([('code', self.pa.string()), ('date', self.pa.date32()),
+                                      ('mid', self.pa.float64())])
+        self.writer = pq.ParquetWriter(path, self.schema, compression='snappy')
+        self.codes, self.dates, self.mids = [], [], []
+
+    def write(self, code, rows):
+        for d, mid in rows:
+            self.codes.append(code)
+            self.dates.append(date.fromisoformat(d))
+            self.mids.append(mid)
+        if len(self.mids) >= ROW_GROUP:
+            self._flush()
+
+    def _flush(self):
+        if self.mids:
+            self.writer.write_table(self.pa.table([self.codes, self.dates, self.mids], schema=self.schema))
+            self.codes, self.dates, self.mids = [], [], []
+
+    def close(self):
+        self._flush()
+        self.writer.close()
+
+
+class XlsxStream:
+    # arkusz na walutę jak w zestawieniu /batch; openpyxl w trybie write_only trzyma wiersze w pliku tymczasowym
+    def __init__(self, path):
+        self.path = path
+        self.wb = _workbook()
+        self.code = None
+        self.sheet = None
+
+    def write(self, code, rows):
+        if code != self.code:
+            self.code = code
+            self.sheet = self.wb.create_sheet(title=code)
+            self.sheet.append(['date', 'mid'])
+        for d, mid in rows:
+            self.sheet.append([date.fromisoformat(d), mid])
+
+    def close(self):
+        self.wb.save(self.path)
+
+
+STREAMS = {
+    'parquet': ParquetStream,
+    'csv.gz': CsvGzStream,
+    'xlsx': XlsxStream,
+}
+
+
+@contextmanager
+def stream(fmt, path):
+    # pod docelową nazwą plik pojawia się dopiero w całości, więc inne zadania nie odczytają połowy
+    tmp_path = f'{path}.tmp'
+    out = STREAMS[fmt](tmp_path)
+    try:
+        yield out
+        out.close()
+        os.replace(tmp_path, path)
+    except BaseException:
+        with suppress(Exception):
+            out.close()
+        with suppress(FileNotFoundError):
+            os.remove(tmp_path)
+        raise
+
+
+def get_export(code, rates, fmt):
+    build, _ = EXPORTS[fmt]
+    return filecache.cached(
+        EXPORT_DIR,
+        f'{code}_{filecache.fingerprint(code, fmt, rates)}.{fmt}',
+        lambda: build(rates).getvalue(),
+        MAX_FILES,
+        MAX_BYTES
+    )
+
+
+def get_batch_export(series):
+    return filecache.cached(
+        EXPORT_DIR,
+        f'ALL_{filecache.series_fingerprint("xlsx", series)}.xlsx',
+        lambda: batch_excel_bytes(series).getvalue(),
+        MAX_FILES,
+        MAX_BYTES
+    )
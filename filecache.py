@@ -0,0 +1,92 @@
+import hashlib
+import os
+import tempfile
+import threading
+import metrics
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# przybliżona liczba plików i bajtów w każdym katalogu, żeby nie przeglądać go przy każdym nowym pliku;
+# pliki dopisane przez inne procesy serwera widać dopiero po kolejnym przejrzeniu, stąd RESCAN_EVERY
+RESCAN_EVERY = 100
+_usage = {}
+_usage_lock = threading.Lock()
+
+
+def fingerprint(code, label, rates):
+    h = hashlib.sha256(f'{code}:{label}:'.encode())
+    for d, mid in rates:
+        h.update(f'{d}={mid!r};'.encode())
+    return h.hexdigest()[:16]
+
+
+def series_fingerprint(label, series):
+    h = hashlib.sha256()
+    for code, rates in series.items():
+        h.update(fingerprint(code, label, rates).encode())
+    return h.hexdigest()[:16]
+
+
+def cached(directory, filename, build, max_files, max_bytes):
+    path = os.path.join(directory, filename)
+    cache = os.path.basename(directory)
+
+    if os.path.exists(path):
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        else:
+            metrics.inc('cache_requests_total', cache=cache, result='hit')
+            return filename
+
+    metrics.inc('cache_requests_total', cache=cache, result='miss')
+    # najpierw treść, dopiero potem plik tymczasowy, żeby nieudane generowanie nie zostawiało otwartego pliku
+    with metrics.stage(cache):
+        data = build()
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+    with _usage_lock:
+        usage = _usage.get(directory)
+        if usage is not None:
+            # nadpisany plik liczy się podwójnie, więc katalog jest co najwyżej przeglądany za wcześnie
+            usage[0] += 1
+            usage[1] += len(data)
+            usage[2] += 1
+        over = usage is None or usage[0] > max_files or usage[1] > max_bytes or usage[2] >= RESCAN_EVERY
+    if over:
+        evict(directory, max_files, max_bytes)
+    return filename
+
+
+def evict(directory, max_files, max_bytes):
+    entries = []
+    for name in os.listdir(directory):
+        if name.endswith('.tmp'):
+            continue
+        try:
+            st = os.stat(os.path.join(directory, name))
+        except FileNotFoundError:
+            continue
+        entries.append((st.st_mtime, st.st_size, name))
+
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    while entries and (len(entries) > max_files or total > max_bytes):
+        _, size, name = entries.pop(0)
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            pass
+        total -= size
+
+    with _usage_lock:
+        _usage[directory] = [len(entries), total, 0]
@@ -0,0 +1,112 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+HELP = {
+    'http_requests_total': 'Liczba odpowiedzi HTTP według endpointu i statusu.',
+    'http_request_duration_seconds': 'Czas obsługi zapytania HTTP.',
+    'stage_duration_seconds': 'Czas poszczególnych etapów obsługi zapytania.',
+    'cache_requests_total': 'Trafienia i chybienia pamięci podręcznej plików.',
+    'nbp_requests_total': 'Zapytania do API NBP według statusu.',
+    'nbp_errors_total': 'Nieudane zapytania do API NBP.',
+}
+
+_lock = threading.Lock()
+_counters = defaultdict(float)
+_histograms = {}
+_timings = ContextVar('timings', default=None)
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, value=1, **labels):
+    with _lock:
+        _counters[_key(name, labels)] += value
+
+
+def observe(name, value, **labels):
+    key = _key(name, labels)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = [[0] * len(BUCKETS), 0.0, 0]
+        i = bisect_left(BUCKETS, value)
+        if i < len(BUCKETS):
+            hist[0][i] += 1
+        hist[1] += value
+        hist[2] += 1
+
+
+def start_request():
+    _timings.set([])
+
+
+def request_timings():
+    return _timings.get() or []
+
+
+@contextmanager
+def stage(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        observe('stage_duration_seconds', elapsed, stage=name)
+        timings = _timings.get()
+        if timings is not None:
+            timings.append((name, elapsed))
+
+
+def server_timing_header(timings):
+    totals = defaultdict(float)
+    for name, elapsed in timings:
+        totals[name] += elapsed
+    return ', '.join(f'{name};dur={elapsed * 1000:.1f}' for name, elapsed in totals.items())
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def render():
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: (list(h[0]), h[1], h[2]) for key, h in _histograms.items()}
+
+    lines = []
+    described = set()
+
+    def describe(name, kind):
+        if name not in described:
+            described.add(name)
+            if name in HELP:
+                lines.append(f'# HELP {name} {HELP[name]}')
+            lines.append(f'# TYPE {name} {kind}')
+
+    for (name, labels), value in sorted(counters.items()):
+        describe(name, 'counter')
+        lines.append(f'{name}{_labels(labels)} {value:g}')
+
+    for (name, labels), (buckets, total, count) in sorted(histograms.items()):
+        describe(name, 'histogram')
+        cumulative = 0
+        for bound, n in zip(BUCKETS, buckets):
+            cumulative += n
+            lines.append(f'{name}_bucket{_labels(labels, [("le", f"{bound:g}")])} {cumulative}')
+        lines.append(f'{name}_bucket{_labels(labels, [("le", "+Inf")])} {count}')
+        lines.append(f'{name}_sum{_labels(labels)} {total:.6f}')
+        lines.append(f'{name}_count{_labels(labels)} {count}')
+
+    return '\n'.join(lines) + '\n'
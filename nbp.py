@@ -0,0 +1,193 @@
+import os
+import threading
+import time as clock
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time, timedelta
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import metrics
+
+API_URL = os.environ.get('NBP_API_URL', 'https://api.nbp.pl/api').rstrip('/')
+TIMEOUT = (float(os.environ.get('NBP_CONNECT_TIMEOUT', 3.05)), float(os.environ.get('NBP_READ_TIMEOUT', 10)))
+
+# NBP nie zwraca więcej niż 93 dni w jednym zapytaniu, a tabela A zaczyna się 2 stycznia 2002
+MAX_DAYS = 93
+FIRST_DATE = date(2002, 1, 2)
+
+# tabela A ukazuje się w dni robocze między 11:45 a 12:15
+PUBLISH_TIME = time(12, 15)
+
+session = requests.Session()
+session.headers['Accept'] = 'application/json'
+_adapter = HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=32,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(['GET']),
+        raise_on_status=False,
+    ),
+)
+session.mount('https://', _adapter)
+session.mount('http://', _adapter)
+
+
+_executor = ThreadPoolExecutor(max_workers=int(os.environ.get('NBP_FETCH_WORKERS', 4)))
+
+# po kilku nieudanych zapytaniach z rzędu przestajemy pytać NBP na COOLDOWN sekund
+BREAKER_FAILURES = int(os.environ.get('NBP_BREAKER_FAILURES', 5))
+BREAKER_COOLDOWN = float(os.environ.get('NBP_BREAKER_COOLDOWN', 60))
+
+_breaker_lock = threading.Lock()
+_failures = 0
+_open_until = 0.0
+
+
+class FetchError(Exception):
+    pass
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def _allow_request():
+    global _open_until
+    with _breaker_lock:
+        now = clock.monotonic()
+        if now < _open_until:
+            return False
+        if _failures >= BREAKER_FAILURES:
+            # po przerwie przepuszczamy jedno zapytanie próbne, pozostałe czekają na kolejne okno
+            _open_until = now + BREAKER_COOLDOWN
+        return True
+
+
+def _record_result(ok):
+    global _failures, _open_until
+    with _breaker_lock:
+        if ok:
+            _failures = 0
+            _open_until = 0.0
+            return
+        _failures += 1
+        if _failures >= BREAKER_FAILURES:
+            _open_until = clock.monotonic() + BREAKER_COOLDOWN
+
+
+def breaker_open():
+    with _breaker_lock:
+        return _failures >= BREAKER_FAILURES
+
+
+def _get(url):
+    if not _allow_request():
+        metrics.inc('nbp_errors_total', reason='breaker')
+        raise FetchError("NBP jest chwilowo niedostępne, ponowna próba za chwilę")
+
+    try:
+        with metrics.stage('nbp'):
+            response = session.get(url, params={'format': 'json'}, timeout=TIMEOUT)
+    except requests.RequestException as e:
+        _record_result(False)
+        metrics.inc('nbp_errors_total', reason='connection')
+        raise FetchError(f"Błąd połączenia z NBP: {e}") from e
+
+    _record_result(response.status_code < 500 and response.status_code != 429)
+    metrics.inc('nbp_requests_total', status=response.status_code)
+    # NBP odpowiada 404, gdy w zakresie nie ma żadnego notowania (np. weekend)
+    if response.status_code == 404:
+        return None
+    if response.status_code != 200:
+        metrics.inc('nbp_errors_total', reason='status')
+        raise FetchError(f"NBP zwróciło status {response.status_code}")
+    return response.json()
+
+
+def get_json(path):
+    url = f'{API_URL}/{path.strip("/")}/'
+
+    with _inflight_lock:
+        call = _inflight.get(url)
+        leader = call is None
+        if leader:
+            call = _inflight[url] = _Call()
+
+    if not leader:
+        call.done.wait()
+        if call.error:
+            raise call.error
+        return call.result
+
+    try:
+        call.result = _get(url)
+    except Exception as e:
+        call.error = e
+        raise
+    finally:
+        with _inflight_lock:
+            del _inflight[url]
+        call.done.set()
+    return call.result
+
+
+def chunks(start, end, days=MAX_DAYS):
+    while start <= end:
+        chunk_end = min(end, start + timedelta(days=days - 1))
+        yield start, chunk_end
+        start = chunk_end + timedelta(days=1)
+
+
+def _chunked(fetch, start, end):
+    ranges = list(chunks(start, end))
+    if len(ranges) == 1:
+        return fetch(*ranges[0])
+    parts = _executor.map(lambda r: fetch(*r), ranges)
+    return [row for part in parts for row in part]
+
+
+def parse_rates(data):
+    if data is None:
+        return []
+    return [(r['effectiveDate'], r['mid']) for r in data['rates']]
+
+
+def parse_table(data):
+    if data is None:
+        return []
+    return [(t['effectiveDate'], {r['code']: r['mid'] for r in t['rates']}) for t in data]
+
+
+def _get_rates(table, code, start, end):
+    return parse_rates(get_json(f'exchangerates/rates/{table}/{code}/{start.isoformat()}/{end.isoformat()}'))
+
+
+def _get_table(table, start, end):
+    return parse_table(get_json(f'exchangerates/tables/{table}/{start.isoformat()}/{end.isoformat()}'))
+
+
+def get_rates(table, code, start, end):
+    return _chunked(lambda a, b: _get_rates(table, code, a, b), start, end)
+
+
+def get_table(table, start, end):
+    return _chunked(lambda a, b: _get_table(table, a, b), start, end)
+
+
+def next_publication(now, at=PUBLISH_TIME):
+    candidate = datetime.combine(now.date(), at)
+    if candidate <= now:
+        candidate += timedelta(days=1)
+    while candidate.weekday() >= 5:
+        candidate += timedelta(days=1)
+    return candidate
@@ -0,0 +1,50 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date
+from functools import lru_cache
+
+
+@lru_cache(maxsize=None)
+def iso(day):
+    # dni notowań od 2002 roku jest kilka tysięcy, więc napisy z datami są wspólne dla wszystkich walut
+    return date.fromordinal(day).isoformat()
+
+
+class Series:
+    # notowania jednej waluty w dwóch tablicach: numer dnia (4 bajty) i kurs (8 bajtów)
+    def __init__(self):
+        self.days = array('i')
+        self.mids = array('d')
+        self.bounds = None
+        self.version = 0
+
+    def __len__(self):
+        return len(self.days)
+
+    def merge(self, rows):
+        before_days, before_mids = array('i'), array('d')
+        first = self.days[0] if self.days else None
+        for d, mid in rows:
+            day = date.fromisoformat(d).toordinal()
+            if first is not None and day < first:
+                before_days.append(day)
+                before_mids.append(mid)
+            elif not self.days or day > self.days[-1]:
+                self.days.append(day)
+                self.mids.append(mid)
+        if before_days:
+            self.days[0:0] = before_days
+            self.mids[0:0] = before_mids
+        self.version += 1
+
+    def _bounds(self, start, end):
+        i = bisect_left(self.days, start.toordinal())
+        return i, bisect_right(self.days, end.toordinal(), i)
+
+    def slice(self, start, end):
+        i, j = self._bounds(start, end)
+        return list(zip(map(iso, self.days[i:j]), self.mids[i:j]))
+
+    def columns(self, start, end):
+        i, j = self._bounds(start, end)
+        return self.days[i:j], self.mids[i:j]
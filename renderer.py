@@ -0,0 +1,191 @@
+import io
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date
+
+# procesy potomne dziedziczą zmienną, więc matplotlib nigdzie nie szuka interfejsu graficznego
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+WORKERS = int(os.environ.get('RENDER_WORKERS', min(4, os.cpu_count() or 1)))
+TIMEOUT = 60
+MARKER_LIMIT = 100
+
+_pool = None
+_pool_lock = threading.Lock()
+# puste zadania zlecane przy tworzeniu puli: procesy są gotowe, gdy każde się wykonało (po _init_worker)
+_warming = []
+_inline_lock = threading.Lock()
+
+_fig = None
+_ax = None
+_line = None
+_overlay = None
+_multi = None
+
+
+def _new_axes(ylabel):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.dates as mdates
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    fig = Figure(figsize=(12, 6))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+
+    locator = mdates.AutoDateLocator()
+    ax.xaxis.set_major_locator(locator)
+    ax.xaxis.set_major_formatter(mdates.AutoDateFormatter(locator))
+    ax.set_xlabel('Data')
+    ax.set_ylabel(ylabel)
+    ax.grid(True, linestyle='--', alpha=0.7)
+
+    # stałe marginesy zamiast tight_layout, który przy każdym rysunku liczyłby układ od nowa
+    fig.subplots_adjust(left=0.08, right=0.98, top=0.94, bottom=0.18)
+    return fig, ax
+
+
+def _dates(rates):
+    import matplotlib.dates as mdates
+    return mdates.date2num([date.fromisoformat(d) for d, _ in rates])
+
+
+def _save(fig, ax, title):
+    ax.set_title(title)
+    ax.relim()
+    ax.autoscale_view()
+    for label in ax.get_xticklabels():
+        label.set_rotation(45)
+        label.set_horizontalalignment('right')
+
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png')
+    return buf.getvalue()
+
+
+def _init_worker():
+    global _fig, _ax, _line, _overlay
+    fig, ax = _new_axes('Kurs (PLN)')
+    line, = ax.plot([], [], marker='o', linestyle='-', color='b', label='Kurs')
+    overlay, = ax.plot([], [], linestyle='-', color='orange', linewidth=2)
+    _fig, _ax, _line, _overlay = fig, ax, line, overlay
+
+    # pierwszy rysunek ładuje czcionki i bufory Agg, kolejne już tylko podmieniają dane
+    _draw('Kurs', [('2000-01-03', 0.0275), ('2000-02-28', 4.5678)])
+
+
+def _marker(rates):
+    return 'o' if len(rates) <= MARKER_LIMIT else ''
+
+
+def _draw(title, rates, overlay=(), overlay_label=None):
+    _line.set_data(_dates(rates), [mid for _, mid in rates])
+    _line.set_marker(_marker(rates))
+
+    # druga linia (np. średnia krocząca) jest zawsze na wykresie, bez nakładki ma po prostu puste dane
+    _overlay.set_data(_dates(overlay) if overlay else [], [value for _, value in overlay])
+    _overlay.set_label(overlay_label or '')
+    if overlay:
+        _ax.legend(handles=[_line, _overlay], loc='upper left')
+    elif _ax.get_legend():
+        _ax.get_legend().remove()
+    return _save(_fig, _ax, title)
+
+
+def _draw_multi(title, series):
+    global _multi
+    if _multi is None:
+        _multi = _new_axes('Kurs (pierwszy dzień = 100)')
+    fig, ax = _multi
+
+    for line in list(ax.lines):
+        line.remove()
+    ax.set_prop_cycle(None)
+
+    # waluty mają różne rzędy wielkości (JPY i GBP), więc rysujemy zmianę względem pierwszego dnia
+    for code, rates in series:
+        if rates:
+            base = rates[0][1]
+            ax.plot(_dates(rates), [mid / base * 100 for _, mid in rates],
+                    marker=_marker(rates), markersize=3, linestyle='-', label=code)
+    # przy kilkudziesięciu walutach (cała tabela A albo B) legenda ma więcej kolumn, żeby nie zasłaniała wykresu
+    ax.legend(loc='upper left', ncols=max(5, math.ceil(len(series) / 4)), fontsize='small')
+
+    return _save(fig, ax, title)
+
+
+def _get_pool():
+    global _pool, _warming
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+            )
+            _warming = [_pool.submit(_noop) for _ in range(WORKERS)]
+        return _pool
+
+
+def _run(fn, *args):
+    if WORKERS <= 0:
+        with _inline_lock:
+            if _fig is None:
+                _init_worker()
+            return fn(*args)
+
+    pool = _get_pool()
+    try:
+        return pool.submit(fn, *args).result(timeout=TIMEOUT)
+    except BrokenProcessPool:
+        _discard(pool)
+        return _get_pool().submit(fn, *args).result(timeout=TIMEOUT)
+
+
+def _discard(broken):
+    # kilka wątków może naraz trafić na tę samą zepsutą pulę; nową, utworzoną przez pierwszy z nich, zostawiamy
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def _noop():
+    return None
+
+
+def warm():
+    # nowa pula od razu uruchamia wszystkie procesy (zadania _noop), więc wystarczy ją utworzyć
+    if WORKERS <= 0:
+        return
+    _get_pool()
+
+
+def is_warm():
+    if WORKERS <= 0:
+        return True
+    warming = _warming
+    return bool(warming) and all(f.done() and not f.cancelled() and f.exception() is None for f in warming)
+
+
+def render_png(title, rates, overlay=(), overlay_label=None):
+    return _run(_draw, title, [tuple(r) for r in rates], [tuple(r) for r in overlay], overlay_label)
+
+
+def render_multi_png(title, series):
+    return _run(_draw_multi, title, [(code, [tuple(r) for r in rates]) for code, rates in series.items()])
+
+
+def shutdown():
+    global _pool, _warming
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+            _warming = []
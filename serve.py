@@ -0,0 +1,61 @@
+import argparse
+import os
+import threading
+import renderer
+from app import app
+
+
+def warm_in_background(worker=None):
+    # procesy rysujące startują w tle, żeby pierwszy wykres nie czekał na import matplotlib
+    threading.Thread(target=renderer.warm, daemon=True).start()
+
+
+def run_waitress(args):
+    from waitress import serve
+    serve(app, host=args.host, port=args.port, threads=args.threads)
+
+
+def run_gunicorn(args):
+    from gunicorn.app.base import BaseApplication
+
+    class Server(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', f'{args.host}:{args.port}')
+            self.cfg.set('workers', args.workers)
+            self.cfg.set('threads', args.threads)
+            self.cfg.set('worker_class', 'gthread')
+            self.cfg.set('timeout', 60)
+            self.cfg.set('post_worker_init', warm_in_background)
+
+        def load(self):
+            return app
+
+    Server().run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serwer produkcyjny aplikacji z kursami walut.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 1111)))
+    parser.add_argument('--threads', type=int, default=8, help='liczba wątków na proces')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='liczba procesów (więcej niż 1 wymaga gunicorn, tylko Linux/macOS)')
+    parser.add_argument('--warm', action='store_true',
+                        help='w tle przygotowuje wykresy i pliki po każdej publikacji tabeli NBP')
+    args = parser.parse_args()
+
+    if args.warm:
+        if args.workers > 1:
+            parser.error('--warm działa tylko z jednym procesem, przy kilku uruchom osobno: python3 warm.py --daemon')
+        import warm
+        threading.Thread(target=warm.run_forever, daemon=True).start()
+
+    if args.workers > 1:
+        run_gunicorn(args)
+    else:
+        warm_in_background()
+        run_waitress(args)
+
+
+if __name__ == '__main__':
+    main()
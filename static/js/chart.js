@@ -0,0 +1,117 @@
+function drawChart(canvas, data) {
+    const ctx = canvas.getContext('2d');
+    const width = canvas.width;
+    const height = canvas.height;
+    const margin = { left: 70, right: 20, top: 40, bottom: 80 };
+    const plotWidth = width - margin.left - margin.right;
+    const plotHeight = height - margin.top - margin.bottom;
+
+    const times = data.rates.map(r => Date.parse(r.date));
+    const mids = data.rates.map(r => r.mid);
+    const minTime = Math.min(...times);
+    const maxTime = Math.max(...times);
+    let minMid = Math.min(...mids);
+    let maxMid = Math.max(...mids);
+    const pad = (maxMid - minMid) * 0.05 || Math.abs(maxMid) * 0.01 || 1;
+    minMid -= pad;
+    maxMid += pad;
+
+    const x = t => margin.left + (maxTime === minTime ? plotWidth / 2 : (t - minTime) / (maxTime - minTime) * plotWidth);
+    const y = v => margin.top + (maxMid - v) / (maxMid - minMid) * plotHeight;
+
+    ctx.clearRect(0, 0, width, height);
+    ctx.font = '14px sans-serif';
+    ctx.fillStyle = '#000';
+
+    ctx.textAlign = 'center';
+    ctx.fillText(`Kurs ${data.code} - ${data.period}`, width / 2, 24);
+    ctx.fillText('Data', margin.left + plotWidth / 2, height - 10);
+
+    ctx.save();
+    ctx.translate(16, margin.top + plotHeight / 2);
+    ctx.rotate(-Math.PI / 2);
+    ctx.fillText('Kurs (PLN)', 0, 0);
+    ctx.restore();
+
+    ctx.strokeStyle = '#bbb';
+    ctx.setLineDash([4, 4]);
+    ctx.textAlign = 'right';
+    ctx.textBaseline = 'middle';
+    const yTicks = 6;
+    for (let i = 0; i <= yTicks; i++) {
+        const v = minMid + (maxMid - minMid) * i / yTicks;
+        ctx.beginPath();
+        ctx.moveTo(margin.left, y(v));
+        ctx.lineTo(margin.left + plotWidth, y(v));
+        ctx.stroke();
+        ctx.fillText(v.toFixed(4), margin.left - 6, y(v));
+    }
+
+    const step = Math.max(1, Math.ceil(data.rates.length / 10));
+    for (let i = 0; i < data.rates.length; i += step) {
+        const px = x(times[i]);
+        ctx.beginPath();
+        ctx.moveTo(px, margin.top);
+        ctx.lineTo(px, margin.top + plotHeight);
+        ctx.stroke();
+
+        ctx.save();
+        ctx.translate(px, margin.top + plotHeight + 8);
+        ctx.rotate(-Math.PI / 4);
+        ctx.fillText(data.rates[i].date, 0, 0);
+        ctx.restore();
+    }
+    ctx.setLineDash([]);
+
+    ctx.strokeStyle = '#000';
+    ctx.strokeRect(margin.left, margin.top, plotWidth, plotHeight);
+
+    ctx.strokeStyle = 'blue';
+    ctx.fillStyle = 'blue';
+    ctx.lineWidth = 2;
+    ctx.beginPath();
+    times.forEach((t, i) => (i ? ctx.lineTo(x(t), y(mids[i])) : ctx.moveTo(x(t), y(mids[i]))));
+    ctx.stroke();
+    times.forEach((t, i) => {
+        ctx.beginPath();
+        ctx.arc(x(t), y(mids[i]), 4, 0, 2 * Math.PI);
+        ctx.fill();
+    });
+
+    // /api/analytics dokłada średnią kroczącą, rysowaną od pierwszego pełnego okna
+    if (data.window) {
+        ctx.strokeStyle = 'orange';
+        ctx.beginPath();
+        let started = false;
+        data.rates.forEach((r, i) => {
+            if (r.ma === null) {
+                return;
+            }
+            started ? ctx.lineTo(x(times[i]), y(r.ma)) : ctx.moveTo(x(times[i]), y(r.ma));
+            started = true;
+        });
+        ctx.stroke();
+
+        ctx.fillStyle = 'orange';
+        ctx.textAlign = 'left';
+        ctx.fillText(`Średnia z ${data.window} notowań`, margin.left + 8, margin.top + 16);
+    }
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+    const canvas = document.getElementById('chart');
+    if (!canvas) {
+        return;
+    }
+    fetch(canvas.dataset.src)
+        .then(response => {
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}`);
+            }
+            return response.json();
+        })
+        .then(data => drawChart(canvas, data))
+        .catch(error => {
+            canvas.replaceWith(document.createTextNode(`Nie udało się narysować wykresu: ${error.message}`));
+        });
+});
@@ -0,0 +1,300 @@
+import logging
+import os
+import sqlite3
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from contextlib import ExitStack
+from datetime import date, datetime, timedelta
+import catalog
+import nbp
+import rateindex
+
+DB_PATH = os.environ.get('RATES_DB', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rates.db'))
+
+BACKFILL_WEEKS = 8
+SYNC_INTERVAL = timedelta(minutes=15)
+# tyle najwyżej czeka zapytanie na brakujące dane, potem dostaje to, co już jest w bazie
+SYNC_WAIT = float(os.environ.get('SYNC_WAIT', 5))
+
+FRESH, STALE, MISSING = 'fresh', 'stale', 'missing'
+
+log = logging.getLogger(__name__)
+
+_locks = defaultdict(threading.Lock)
+
+# notowania trzymane w pamięci procesu, baza jest czytana tylko po zmianie danych
+_index = {}
+_index_lock = threading.Lock()
+_watch = None
+_data_version = None
+
+_refresh_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='refresh')
+_pending = {}
+_pending_lock = threading.Lock()
+
+
+def _connect():
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    conn.execute('PRAGMA journal_mode=WAL')
+    return conn
+
+
+def init_db():
+    with _connect() as conn:
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS rates ('
+            'code TEXT NOT NULL, date TEXT NOT NULL, mid REAL NOT NULL, '
+            'PRIMARY KEY (code, date))'
+        )
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS sync ('
+            'code TEXT PRIMARY KEY, first TEXT NOT NULL, last TEXT, checked TEXT NOT NULL)'
+        )
+
+
+def ping():
+    with _connect() as conn:
+        conn.execute('SELECT 1').fetchone()
+
+
+def _sync_state(conn, code):
+    row = conn.execute('SELECT first, last, checked FROM sync WHERE code = ?', (code,)).fetchone()
+    if row is None:
+        return None
+    first, last, checked = row
+    return (
+        date.fromisoformat(first),
+        date.fromisoformat(last) if last else None,
+        datetime.fromisoformat(checked),
+    )
+
+
+def _plan(state, start, today, force):
+    if state is None:
+        return start, None, None, [(start, today)]
+
+    first, last, checked = state
+    ranges = []
+    if start < first:
+        ranges.append((start, first - timedelta(days=1)))
+    if force or datetime.now() - checked >= SYNC_INTERVAL:
+        ranges.append((last + timedelta(days=1) if last else first, today))
+        checked = None
+    ranges = [(a, b) for a, b in ranges if a <= b]
+
+    if not ranges and checked is not None:
+        return None
+    return min(first, start), last, checked, ranges
+
+
+def _save(conn, code, first, last, checked, rates):
+    if rates:
+        last = max(last or first, max(date.fromisoformat(d) for d, _ in rates))
+    checked = checked or datetime.now()
+
+    conn.executemany(
+        'INSERT OR REPLACE INTO rates (code, date, mid) VALUES (?, ?, ?)',
+        [(code, d, mid) for d, mid in rates]
+    )
+    conn.execute(
+        'INSERT OR REPLACE INTO sync (code, first, last, checked) VALUES (?, ?, ?, ?)',
+        (code, first.isoformat(), last.isoformat() if last else None, checked.isoformat())
+    )
+
+
+def _merge(ranges):
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + timedelta(days=1):
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _default_start(start, today):
+    start = start or today - timedelta(weeks=BACKFILL_WEEKS)
+    return max(start, nbp.FIRST_DATE)
+
+
+def sync(code, start=None, force=False):
+    today = date.today()
+    start = _default_start(start, today)
+
+    with _locks[code]:
+        with _connect() as conn:
+            plan = _plan(_sync_state(conn, code), start, today, force)
+        if plan is None:
+            return
+
+        first, last, checked, ranges = plan
+        rates = [r for a, b in ranges for r in nbp.get_rates(catalog.table(code), code, a, b)]
+
+        with _connect() as conn:
+            _save(conn, code, first, last, checked, rates)
+
+
+def sync_all(codes, start=None, force=False):
+    today = date.today()
+    start = _default_start(start, today)
+    # bez powtórzeń: drugie wejście w tę samą blokadę (zwykły Lock) zawiesiłoby wątek na zawsze
+    codes = sorted(set(codes))
+
+    with ExitStack() as stack:
+        # blokady zawsze w tej samej kolejności, żeby równoległe sync_all się nie zakleszczyły
+        for code in codes:
+            stack.enter_context(_locks[code])
+
+        with _connect() as conn:
+            plans = {code: _plan(_sync_state(conn, code), start, today, force) for code in codes}
+        plans = {code: plan for code, plan in plans.items() if plan is not None}
+        if not plans:
+            return
+
+        # jedno zapytanie o całą tabelę obsługuje wszystkie jej waluty, których zakresy się pokrywają
+        tables = {}
+        for name in sorted({catalog.table(code) for code in plans}):
+            ranges = [r for code, plan in plans.items() if catalog.table(code) == name for r in plan[3]]
+            tables[name] = [row for a, b in _merge(ranges) for row in nbp.get_table(name, a, b)]
+
+        with _connect() as conn:
+            for code, (first, last, checked, ranges) in plans.items():
+                wanted = [(a.isoformat(), b.isoformat()) for a, b in ranges]
+                rates = [(d, mids[code]) for d, mids in tables[catalog.table(code)]
+                         if code in mids and any(a <= d <= b for a, b in wanted)]
+                _save(conn, code, first, last, checked, rates)
+
+
+def _freshness(states, start):
+    if any(state is None or start < state[0] for state in states):
+        return MISSING
+    if any(datetime.now() - checked >= SYNC_INTERVAL for _, _, checked in states):
+        return STALE
+    return FRESH
+
+
+def _log_failure(future):
+    if future.exception() is not None:
+        log.warning("Odświeżanie danych z NBP nie powiodło się: %s", future.exception())
+
+
+def _submit(key, fn, *args):
+    # jedno odświeżanie naraz dla tych samych walut, kolejne zapytania dostają to samo zadanie
+    with _pending_lock:
+        future = _pending.get(key)
+        started = future is None
+        if started:
+            future = _pending[key] = _refresh_pool.submit(fn, *args)
+    # poza blokadą, bo zadanie mogło się już skończyć i wtedy callback uruchamia się od razu
+    if started:
+        future.add_done_callback(lambda f: _forget(key, f))
+        future.add_done_callback(_log_failure)
+    return future
+
+
+def _forget(key, future):
+    with _pending_lock:
+        if _pending.get(key) is future:
+            del _pending[key]
+
+
+def refresh(codes, start=None, wait=SYNC_WAIT):
+    today = date.today()
+    start = _default_start(start, today)
+    codes = sorted(set(codes))
+
+    with _connect() as conn:
+        freshness = _freshness([_sync_state(conn, code) for code in codes], start)
+    if freshness == FRESH:
+        return True
+
+    fn = sync if len(codes) == 1 else sync_all
+    arg = codes[0] if len(codes) == 1 else codes
+
+    # stale-while-revalidate: mamy dane, więc oddajemy je od razu, a nowe notowania pobieramy w tle
+    if freshness == STALE:
+        _submit((tuple(codes), None), fn, arg, start)
+        return False
+
+    future = _submit((tuple(codes), start), fn, arg, start)
+    try:
+        future.result(timeout=wait)
+    except TimeoutError:
+        return False
+    return True
+
+
+def _changed():
+    global _watch, _data_version
+    # data_version zmienia się po każdym zapisie z innego połączenia, także z innego procesu
+    if _watch is None:
+        _watch = sqlite3.connect(DB_PATH, check_same_thread=False)
+    version = _watch.execute('PRAGMA data_version').fetchone()[0]
+    changed = version != _data_version
+    _data_version = version
+    return changed
+
+
+def _load(conn, code, series):
+    if not series:
+        rows = conn.execute('SELECT date, mid FROM rates WHERE code = ? ORDER BY date', (code,))
+    else:
+        first, last = rateindex.iso(series.days[0]), rateindex.iso(series.days[-1])
+        rows = conn.execute(
+            'SELECT date, mid FROM rates WHERE code = ? AND (date < ? OR date > ?) ORDER BY date',
+            (code, first, last)
+        )
+    series.merge(rows)
+
+
+def _indexed(codes):
+    # wywoływane pod _index_lock; dociąga tylko waluty, których zakres w tabeli sync się zmienił
+    new = [code for code in codes if code not in _index]
+    if not _changed() and not new:
+        return
+    for code in new:
+        _index[code] = rateindex.Series()
+
+    with _connect() as conn:
+        bounds = {code: (first, last) for code, first, last in conn.execute('SELECT code, first, last FROM sync')}
+        for code, series in _index.items():
+            if series.bounds != bounds.get(code):
+                _load(conn, code, series)
+                series.bounds = bounds.get(code)
+
+
+def iter_rates(code, start, end, size=10_000):
+    # kursy prosto z bazy, po size wierszy naraz, bez ładowania całej historii do pamięci
+    conn = _connect()
+    try:
+        rows = conn.execute(
+            'SELECT date, mid FROM rates WHERE code = ? AND date BETWEEN ? AND ? ORDER BY date',
+            (code, start.isoformat(), end.isoformat())
+        )
+        while chunk := rows.fetchmany(size):
+            yield chunk
+    finally:
+        conn.close()
+
+
+def get_rates(code, start, end):
+    with _index_lock:
+        _indexed([code])
+        return _index[code].slice(start, end)
+
+
+def get_rates_many(codes, start, end):
+    with _index_lock:
+        _indexed(codes)
+        return {code: _index[code].slice(start, end) for code in codes}
+
+
+def get_columns(codes, start, end):
+    # tablice dni i kursów dla obliczeń (np. numpy.frombuffer), razem z wersją danych każdej waluty
+    with _index_lock:
+        _indexed(codes)
+        return {code: (_index[code].version, *_index[code].columns(start, end)) for code in codes}
+
+
+init_db()
@@ -3,159 +3,156 @@ import shutil
 import os
 import subprocess
 import signal
-import time
 import socket
+import sys
+import time
+import requests
 from pathlib import Path
-from helpers import (
-    assert_currency_page_loaded,
-    switch_page,
-    switch_currency,
-    switch_time,
-    switch_currency_and_time,
-    download_excel_for_currency_and_week,
-    download_chart_for_currency_and_week,
-    get_currency_options,
-    get_time_options,
-    select_three_options,
-    setup_browser
-)
-
-DOWNLOAD_DIR = Path("downloads")
-os.makedirs(DOWNLOAD_DIR, exist_ok=True)
-
-def is_port_in_use(port):
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        return s.connect_ex(('localhost', port)) == 0
-
-server_process = None
+import helpers
+from helpers import select_three_options, get_catalog_codes
 
-@pytest.fixture(scope="session", autouse=True)
-def server():
-    global server_process
-    port = 1111
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+from app import WEEKS
+from catalog import DEFAULT
 
-    if not is_port_in_use(port):
-        app_path = Path(__file__).parent.parent / "app.py"
+DOWNLOAD_DIR = Path("downloads")
 
-        server_process = subprocess.Popen(
-            ["python3", str(app_path)],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            preexec_fn=os.setsid if os.name != 'nt' else None,
-            creationflags=subprocess.CREATE_NEW_PROCESS_GROUP if os.name == 'nt' else 0
-        )
-        time.sleep(2)
+# opcje list wyboru biorą się z aplikacji, a nie z przeglądarki; waluty do parametryzacji
+# są z listy domyślnej, bo katalog z NBP może się zmienić między procesami testów (pytest -n)
+CURRENCY_OPTIONS = list(DEFAULT)
+WEEK_OPTIONS = [str(weeks) for weeks in WEEKS]
 
-    yield
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('localhost', 0))
+        return s.getsockname()[1]
 
-    if server_process:
+def wait_for_server(base_url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
         try:
-            if os.name == 'nt':
-                server_process.send_signal(signal.CTRL_BREAK_EVENT)
-            else:
-                os.killpg(os.getpgid(server_process.pid), signal.SIGTERM)
-            server_process.wait(timeout=5)
-        except Exception as e:
-            print(f"Nie udało się zatrzymać serwera: {e}")
-
-@pytest.fixture(scope="session", autouse=True)
-def ensure_download_dir():
+            if requests.get(f"{base_url}/ready", timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.05)
+    raise RuntimeError(f"Serwer nie odpowiada pod adresem {base_url}")
+
+def wait_for_catalog(base_url, timeout=15):
+    # świeży serwer zaczyna od listy zapasowej (tylko tabela A), a pełną listę z NBP pobiera w tle
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        currencies = requests.get(f"{base_url}/api/currencies", timeout=5).json()["currencies"]
+        if any(c["table"] == "B" for c in currencies):
+            return
+        time.sleep(0.1)
+    raise RuntimeError(f"Serwer {base_url} po {timeout} s ma nadal zapasową listę {len(currencies)} walut "
+                       f"zamiast tabel A i B z NBP (sprawdź NBP_API_URL i dostęp do API)")
+
+def is_worker(config):
+    return hasattr(config, "workerinput")
+
+def pytest_configure(config):
+    # przy pytest -n każdy proces testów ma własny serwer na wolnym porcie
+    # TEST_BASE_URL pozwala zamiast tego testować już uruchomiony serwer
+    config.server_port = None
+    if os.environ.get("TEST_BASE_URL"):
+        helpers.BASE_URL = os.environ["TEST_BASE_URL"].rstrip("/")
+    else:
+        config.server_port = free_port()
+        helpers.BASE_URL = f"http://localhost:{config.server_port}"
+
+    # katalog pobrań czyści tylko proces główny, żeby procesy testów nie kasowały sobie plików
+    if not is_worker(config):
+        shutil.rmtree(DOWNLOAD_DIR, ignore_errors=True)
     DOWNLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
+def start_app(port, env=None):
+    return subprocess.Popen(
+        [sys.executable, str(ROOT / "app.py")],
+        env=dict(os.environ, **(env or {}), PORT=str(port)),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        preexec_fn=os.setsid if os.name != 'nt' else None,
+        creationflags=subprocess.CREATE_NEW_PROCESS_GROUP if os.name == 'nt' else 0
+    )
+
+def stop_app(process):
+    try:
+        if os.name == 'nt':
+            process.send_signal(signal.CTRL_BREAK_EVENT)
+        else:
+            os.killpg(os.getpgid(process.pid), signal.SIGTERM)
+        process.wait(timeout=5)
+    except Exception as e:
+        print(f"Nie udało się zatrzymać serwera: {e}")
+
 @pytest.fixture(scope="session", autouse=True)
-def clean_download_dir():
-    if DOWNLOAD_DIR.exists():
-        shutil.rmtree(DOWNLOAD_DIR, ignore_errors=True)
-    DOWNLOAD_DIR.mkdir(parents=True, exist_ok=True)
-    yield
+def server(pytestconfig):
+    port = pytestconfig.server_port
+    if port is None:
+        wait_for_server(helpers.BASE_URL)
+        wait_for_catalog(helpers.BASE_URL)
+        yield helpers.BASE_URL
+        return
+
+    server_process = start_app(port)
+    try:
+        wait_for_server(helpers.BASE_URL)
+        wait_for_catalog(helpers.BASE_URL)
+        yield helpers.BASE_URL
+    finally:
+        stop_app(server_process)
 
-@pytest.fixture(scope="session")
-def dynamic_currency_codes(playwright, browser_name):
-    browser, context, page = setup_browser(playwright, browser_name)
-    values = get_currency_options(page)
-    browser.close()
-    return select_three_options(values)
+@pytest.fixture(scope="function")
+def isolated_server(tmp_path):
+    # osobny serwer z własną bazą i ustawieniami (np. adresem NBP) dla testów, które psują jego stan
+    processes = []
+
+    def start(**env):
+        port = free_port()
+        env = dict({
+            "RATES_DB": str(tmp_path / "rates.db"),
+            "CHART_DIR": str(tmp_path / "charts"),
+            "EXPORT_DIR": str(tmp_path / "exports"),
+            "CATALOG_PATH": str(tmp_path / "catalog.json"),
+        }, **env)
+        processes.append(start_app(port, env))
+        base_url = f"http://localhost:{port}"
+        wait_for_server(base_url)
+        return base_url
+
+    yield start
+    for process in processes:
+        stop_app(process)
 
 @pytest.fixture(scope="session")
-def dynamic_week_values(playwright, browser_name):
-    browser, context, page = setup_browser(playwright, browser_name)
-    values = get_time_options(page)
-    browser.close()
-    return select_three_options(values)
+def dynamic_currency_codes():
+    return select_three_options(CURRENCY_OPTIONS)
 
 @pytest.fixture(scope="session")
-def currency_options(playwright, browser_name):
-    browser, context, page = setup_browser(playwright, browser_name)
-    page.goto("http://localhost:1111/")
-    page.wait_for_selector("#currency")
-
-    options = page.locator("#currency option")
-    count = options.count()
-    all_values = [options.nth(i).get_attribute("value") for i in range(count)]
-    browser.close()
-
-    return select_three_options(all_values)
+def dynamic_week_values():
+    return select_three_options(WEEK_OPTIONS)
 
 @pytest.fixture(scope="session")
-def time_options(playwright, browser_name):
-    browser, context, page = setup_browser(playwright, browser_name)
-    page.goto("http://localhost:1111/")
-    page.wait_for_selector("#time")
-
-    options = page.locator("#time option")
-    count = options.count()
-    all_values = [options.nth(i).get_attribute("value") for i in range(count)]
-    browser.close()
-
-    return select_three_options(all_values)
+def currency_options():
+    return select_three_options(CURRENCY_OPTIONS)
 
-def select_three_options(options_list):
-    if not options_list:
-        return []
-    first = options_list[0]
-    middle = options_list[len(options_list) // 2]
-    last = options_list[-1]
-    return list(dict.fromkeys([first, middle, last]))
+@pytest.fixture(scope="session")
+def time_options():
+    return select_three_options(WEEK_OPTIONS)
 
 def pytest_generate_tests(metafunc):
-    global server_process
-    port = 1111
-
-    if not is_port_in_use(port):
-        app_path = Path(__file__).parent.parent / "app.py"
-        server_process = subprocess.Popen(
-            ["python3", str(app_path)],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            preexec_fn=os.setsid if os.name != 'nt' else None,
-            creationflags=subprocess.CREATE_NEW_PROCESS_GROUP if os.name == 'nt' else 0
-        )
-        time.sleep(2)
-
-    if "currency" in metafunc.fixturenames or "week" in metafunc.fixturenames:
-        from playwright.sync_api import sync_playwright
-
-        with sync_playwright() as p:
-            browser = p.chromium.launch()
-            context = browser.new_context()
-            page = context.new_page()
-            page.goto("http://localhost:1111/")
-
-            if "currency" in metafunc.fixturenames:
-                all_currency_options = get_currency_options(page)
-                selected_currencies = select_three_options(all_currency_options)
-                metafunc.parametrize("currency", selected_currencies)
-
-            if "week" in metafunc.fixturenames:
-                all_time_options = get_time_options(page)
-                selected_weeks = select_three_options(all_time_options)
-                metafunc.parametrize("week", selected_weeks)
-
-            browser.close()
+    if "currency" in metafunc.fixturenames:
+        metafunc.parametrize("currency", select_three_options(CURRENCY_OPTIONS))
+    if "week" in metafunc.fixturenames:
+        metafunc.parametrize("week", select_three_options(WEEK_OPTIONS))
 
-@pytest.fixture(scope="function")
+@pytest.fixture(scope="session")
 def browser(playwright, browser_name):
-    browser, context, page = setup_browser(playwright, browser_name)
+    # jedna przeglądarka na proces testów, każdy test dostaje tylko nowy kontekst
+    browser = getattr(playwright, browser_name).launch(headless=True)
     yield browser
     browser.close()
 
@@ -167,11 +164,10 @@ def page(browser):
     context.close()
 
 @pytest.fixture(scope="function")
-def currencies_number():
-    currencies_number = 8
-    yield currencies_number
+def currencies_number(server):
+    # liczba walut z katalogu serwera, więc nowe waluty w tabelach NBP nie wymagają zmian w testach
+    yield len(get_catalog_codes())
 
 @pytest.fixture(scope="function")
 def weeks_number():
-    weeks_number = 8
-    yield weeks_number
+    yield len(WEEK_OPTIONS)
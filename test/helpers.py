@@ -1,11 +1,28 @@
 import hashlib
+import io
 import os
+import re
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
 from pathlib import Path
 from pytest_html import extras
+import pandas as pd
 
 DOWNLOAD_DIR = "downloads"
 
+# conftest ustawia adres serwera uruchomionego dla danego procesu testów
+BASE_URL = "http://localhost:1111"
+
+def server_url(path="/"):
+    return f"{BASE_URL}{path}"
+
 def compare_screenshots(page, before_path, after_path, change_desc, selector, extra=None):
     page.screenshot(path=str(before_path), full_page=True)
     page.click("button[type='submit']")
@@ -47,13 +64,13 @@ def setup_browser(playwright, browser_name):
     return browser, context, page
 
 def switch_page(page, currency_code, browser_name=None, extra=None):
-    page.goto("http://localhost:1111/")
+    page.goto(server_url())
     page.select_option("#currency", value=currency_code)
     page.click("button[type='submit']")
     assert_currency_page_loaded(page, currency_code)
 
 def switch_currency(page, browser_name, extra):
-    page.goto("http://localhost:1111/")
+    page.goto(server_url())
     page.wait_for_selector("#currency-table", timeout=5000)
     page.select_option("#currency", value="USD")
 
@@ -88,7 +105,7 @@ def download_chart(page, browser_name, currency_code):
                 img_link.wait_for(state="visible", timeout=3000)
                 href = img_link.get_attribute("href")
                 if href:
-                    url = f"http://localhost:1111{href}" if href.startswith("/") else href
+                    url = server_url(href) if href.startswith("/") else href
                     response = requests.get(url)
                     if response.status_code == 200:
                         with open(chart_path, "wb") as f:
@@ -116,7 +133,7 @@ def download_chart(page, browser_name, currency_code):
         assert chart_path.endswith(".png"), f"Zły format wykresu: {chart_path}"
 
 def switch_time(page, browser_name, currency_code, week_value, extra):
-    page.goto("http://localhost:1111/")
+    page.goto(server_url())
     page.wait_for_selector("#currency-table", timeout=5000)
     page.select_option("#currency", value=currency_code)
 
@@ -142,7 +159,7 @@ def switch_time(page, browser_name, currency_code, week_value, extra):
 
 
 def switch_currency_and_time(page, browser_name, currency_code, week_value, extra):
-    page.goto("http://localhost:1111/")
+    page.goto(server_url())
     page.wait_for_selector("#currency-table", timeout=5000)
 
     page.select_option("#currency", value=currency_code)
@@ -166,7 +183,7 @@ def switch_currency_and_time(page, browser_name, currency_code, week_value, extr
     assert_currency_page_loaded(page, currency_code)
 
 def download_excel_for_currency_and_week(page, currency, week_value, browser_name, extra):
-    page.goto("http://localhost:1111/")
+    page.goto(server_url())
     page.wait_for_selector("#currency-table", timeout=5000)
     page.select_option("#currency", value=currency)
     page.select_option("#time", value=week_value)
@@ -184,7 +201,7 @@ def download_excel_for_currency_and_week(page, currency, week_value, browser_nam
     extra.append(extras.url(filepath, name=f"{currency} Excel ({week_value} tygodni)"))
 
 def download_chart_for_currency_and_week(page, currency, week_value, browser_name, extra):
-    page.goto("http://localhost:1111/")
+    page.goto(server_url())
     page.wait_for_selector("#currency-table", timeout=5000)
     page.select_option("#currency", value=currency)
     page.select_option("#time", value=week_value)
@@ -199,7 +216,7 @@ def download_chart_for_currency_and_week(page, currency, week_value, browser_nam
 
     if browser_name == "webkit":
         try:
-            url = f"http://localhost:1111{href}" if href.startswith("/") else href
+            url = server_url(href) if href.startswith("/") else href
             response = requests.get(url)
             assert response.status_code == 200, f"HTTP status {response.status_code} when downloading chart"
             with open(chart_path, "wb") as f:
@@ -217,14 +234,14 @@ def download_chart_for_currency_and_week(page, currency, week_value, browser_nam
     extra.append(extras.url(chart_path, name=f"{currency} Wykres ({week_value} tygodni)"))
 
 def get_currency_options(page):
-    page.goto("http://localhost:1111/")
+    page.goto(server_url())
     page.wait_for_selector("#currency")
     options = page.locator("#currency option")
     count = options.count()
     return [options.nth(i).get_attribute("value") for i in range(count)]
 
 def get_time_options(page):
-    page.goto("http://localhost:1111/")
+    page.goto(server_url())
     page.wait_for_selector("#time")
     options = page.locator("#time option")
     count = options.count()
@@ -239,7 +256,7 @@ def select_three_options(options_list):
     return list(dict.fromkeys([first, middle, last]))
 
 def check_all_currency_options_present(page, currencies_number):
-    page.goto("http://localhost:1111/")
+    page.goto(server_url())
     page.wait_for_selector("#currency")
 
     currency_options = page.locator("#currency option")
@@ -251,7 +268,7 @@ def check_all_currency_options_present(page, currencies_number):
 
 
 def check_all_time_options_present(page, weeks_number):
-    page.goto("http://localhost:1111/")
+    page.goto(server_url())
     expected = get_time_options(page)
     actual_options = page.locator("#time option")
     actual_count = actual_options.count()
@@ -262,3 +279,450 @@ def check_all_time_options_present(page, weeks_number):
 
     labels = [time_options.nth(i).inner_text() for i in range(count)]
     print("Zakresy czasu na liście:", labels)
+
+
+def check_excel_matches_time(currency, short_week, long_week):
+    lengths = []
+    for week_value in (short_week, long_week):
+        response = requests.get(server_url(f"/download/excel?currency={currency}&time={week_value}"))
+        assert response.status_code == 200, f"HTTP status {response.status_code} przy pobieraniu Excela"
+        lengths.append(len(pd.read_excel(io.BytesIO(response.content))))
+    assert lengths[0] < lengths[1], f"Excel nie zależy od zakresu czasu: {lengths}"
+
+def check_api_rates(currency, week_value):
+    url = server_url(f"/api/rates?currency={currency}&time={week_value}")
+    response = requests.get(url)
+    assert response.status_code == 200, f"HTTP status {response.status_code} z /api/rates"
+    data = response.json()
+    assert data["code"] == currency, f"Zła waluta w odpowiedzi: {data['code']}"
+    assert len(data["rates"]) > 0, "Brak kursów w odpowiedzi /api/rates"
+
+    etag = response.headers.get("ETag")
+    assert etag, "Brak nagłówka ETag"
+    cached = requests.get(url, headers={"If-None-Match": etag})
+    assert cached.status_code == 304, f"Oczekiwano 304, otrzymano {cached.status_code}"
+
+def check_excel_for_long_date_range(currency):
+    url = server_url(f"/download/excel?currency={currency}&start=2024-01-01&end=2024-12-31")
+    response = requests.get(url)
+    assert response.status_code == 200, f"HTTP status {response.status_code} przy pobieraniu Excela"
+    df = pd.read_excel(io.BytesIO(response.content))
+    assert len(df) > 200, f"Za mało notowań za 2024 rok: {len(df)}"
+    assert str(df["date"].min().date()) >= "2024-01-01", f"Notowanie spoza zakresu: {df['date'].min()}"
+    assert str(df["date"].max().date()) <= "2024-12-31", f"Notowanie spoza zakresu: {df['date'].max()}"
+
+def check_server_ready():
+    response = requests.get(server_url("/ready"))
+    assert response.status_code == 200, f"HTTP status {response.status_code} z /ready"
+    assert response.json()["status"] == "ok", f"Serwer nie jest gotowy: {response.json()}"
+
+def check_not_modified(path):
+    url = server_url(path)
+    response = requests.get(url)
+    assert response.status_code == 200, f"HTTP status {response.status_code} z {path}"
+    assert "max-age" in response.headers.get("Cache-Control", ""), f"Brak Cache-Control dla {path}"
+
+    cached = requests.get(url, headers={"If-None-Match": response.headers["ETag"]})
+    assert cached.status_code == 304, f"Oczekiwano 304 dla {path}, otrzymano {cached.status_code}"
+
+def check_metrics(currency):
+    requests.get(server_url(f"/?currency={currency}&time=1"))
+    response = requests.get(server_url("/metrics"))
+    assert response.status_code == 200, f"HTTP status {response.status_code} z /metrics"
+    assert 'http_requests_total{endpoint="index",status="200"}' in response.text, "Brak licznika zapytań strony głównej"
+    assert "stage_duration_seconds_count" in response.text, "Brak czasów etapów obsługi zapytania"
+
+def check_cross_rates(currency, week_value):
+    rates = requests.get(server_url(f"/api/rates?currency={currency}&time={week_value}")).json()["rates"]
+    usd = requests.get(server_url(f"/api/rates?currency=USD&time={week_value}")).json()["rates"]
+    response = requests.get(server_url(f"/api/cross?base={currency}&quote=USD&time={week_value}"))
+    assert response.status_code == 200, f"HTTP status {response.status_code} z /api/cross"
+
+    expected = {r["date"]: r["mid"] / u["mid"] for r, u in zip(rates, usd)}
+    for row in response.json()["rates"]:
+        assert abs(row["rate"] - expected[row["date"]]) < 1e-9, f"Zły kurs {currency}/USD z dnia {row['date']}"
+
+    for query in ("base=EUR,USD&quote=USD", "base=&quote=USD", f"base={currency}"):
+        invalid = requests.get(server_url(f"/api/cross?{query}"))
+        assert invalid.status_code == 400, f"Oczekiwano 400 dla /api/cross?{query}, otrzymano {invalid.status_code}"
+
+    empty = requests.get(server_url("/api/cross/matrix?codes="))
+    assert empty.status_code == 400, f"Oczekiwano 400 dla pustej listy walut, otrzymano {empty.status_code}"
+
+def check_memo_bytes(monkeypatch):
+    import analytics
+    monkeypatch.setattr(analytics, "_memo", analytics.OrderedDict())
+    monkeypatch.setattr(analytics, "_memo_bytes", 0)
+    monkeypatch.setattr(analytics, "MEMO_BYTES", 100 * analytics.ITEM_BYTES)
+
+    # każdy wynik to 40 liczb, więc mieszczą się dwa; trzeci wypycha najdawniej używany
+    for key in ("a", "b", "a", "c"):
+        analytics._memoized(key, lambda: {"rate": [1.0] * 40})
+    assert list(analytics._memo) == ["a", "c"], f"Zły stan pamięci wyników: {list(analytics._memo)}"
+    assert analytics._memo_bytes == 80 * analytics.ITEM_BYTES, f"Zły rozmiar pamięci: {analytics._memo_bytes}"
+
+    # wynik większy niż cały limit jest liczony, ale nie zapamiętywany
+    assert analytics._memoized("big", lambda: {"rate": [1.0] * 200}) == {"rate": [1.0] * 200}
+    assert "big" not in analytics._memo, "Zapamiętano wynik większy niż limit"
+
+def check_series_merge():
+    import rateindex
+    series = rateindex.Series()
+    series.merge([("2024-01-03", 4.3), ("2024-01-04", 4.4)])
+    # starsze notowania trafiają na początek, nowsze na koniec, a już znane dni są pomijane
+    series.merge([("2024-01-01", 4.1), ("2024-01-02", 4.2), ("2024-01-03", 9.9), ("2024-01-05", 4.5)])
+    rates = series.slice(date(2024, 1, 1), date(2024, 1, 31))
+    assert rates == [("2024-01-01", 4.1), ("2024-01-02", 4.2), ("2024-01-03", 4.3), ("2024-01-04", 4.4),
+                     ("2024-01-05", 4.5)], f"Złe notowania po scaleniu: {rates}"
+    assert series.version == 2, f"Wersja po dwóch scaleniach: {series.version}"
+    assert series.slice(date(2024, 1, 2), date(2024, 1, 3)) == rates[1:3], "Zły wycinek notowań"
+
+def write_rates(db_path, code, rates):
+    # zapis z osobnego połączenia, jak z innego procesu serwera albo z warm.py
+    with sqlite3.connect(db_path) as conn:
+        conn.executemany("INSERT OR REPLACE INTO rates (code, date, mid) VALUES (?, ?, ?)",
+                         [(code, d, mid) for d, mid in rates])
+        first, last = conn.execute("SELECT MIN(date), MAX(date) FROM rates WHERE code = ?", (code,)).fetchone()
+        conn.execute("INSERT OR REPLACE INTO sync (code, first, last, checked) VALUES (?, ?, ?, ?)",
+                     (code, first, last, datetime.now().isoformat()))
+
+def check_indexed(db_path, monkeypatch):
+    import store
+    monkeypatch.setattr(store, "DB_PATH", str(db_path))
+    monkeypatch.setattr(store, "_index", {})
+    monkeypatch.setattr(store, "_watch", None)
+    monkeypatch.setattr(store, "_data_version", None)
+    loads = []
+    load = store._load
+    monkeypatch.setattr(store, "_load", lambda conn, code, series: (loads.append(code), load(conn, code, series)))
+    store.init_db()
+    period = (date(2024, 1, 1), date(2024, 12, 31))
+
+    write_rates(db_path, "EUR", [("2024-03-01", 4.3), ("2024-03-04", 4.4)])
+    assert store.get_rates("EUR", *period) == [("2024-03-01", 4.3), ("2024-03-04", 4.4)], "Złe notowania z bazy"
+
+    # bez zmian w bazie indeks nie czyta jej ponownie
+    version = store._index["EUR"].version
+    store.get_rates("EUR", *period)
+    assert loads == ["EUR"], f"Ponowny odczyt z bazy bez zmian: {loads}"
+    assert store._index["EUR"].version == version, "Zmieniona wersja danych bez nowych notowań"
+
+    # dopisane starsze i nowsze notowania z innego połączenia (zmiana PRAGMA data_version)
+    write_rates(db_path, "EUR", [("2024-02-29", 4.2), ("2024-03-05", 4.5)])
+    dates = [d for d, _ in store.get_rates("EUR", *period)]
+    assert dates == ["2024-02-29", "2024-03-01", "2024-03-04", "2024-03-05"], f"Złe daty po dopisaniu: {dates}"
+    assert store._index["EUR"].bounds == ("2024-02-29", "2024-03-05"), f"Zły zakres: {store._index['EUR'].bounds}"
+
+    # zapis innej waluty zmienia data_version, ale zakres EUR w tabeli sync zostaje ten sam
+    version = store._index["EUR"].version
+    write_rates(db_path, "USD", [("2024-03-01", 4.0)])
+    store.get_rates_many(["EUR", "USD"], *period)
+    assert loads == ["EUR", "EUR", "USD"], f"Niepotrzebny odczyt z bazy: {loads}"
+    assert store._index["EUR"].version == version, "Zmieniona wersja EUR po zapisie innej waluty"
+
+def get_catalog_codes():
+    response = requests.get(server_url("/api/currencies"))
+    assert response.status_code == 200, f"HTTP status {response.status_code} z /api/currencies"
+    return [c["code"] for c in response.json()["currencies"]]
+
+def check_currency_in_catalog(currency):
+    codes = get_catalog_codes()
+    assert currency in codes, f"Brak {currency} na liście walut"
+    assert len(codes) == len(set(codes)), "Powtórzone kody na liście walut"
+
+    unknown = requests.get(server_url("/api/cross?base=XXX&quote=USD"))
+    assert unknown.status_code == 400, f"Oczekiwano 400 dla nieznanej waluty, otrzymano {unknown.status_code}"
+
+def check_bulk_export(currency, output_dir):
+    root = Path(__file__).parent.parent
+    subprocess.run([sys.executable, str(root / "bulk_export.py"), "--codes", f"{currency},USD",
+                    "--start", "2024-01-01", "--end", "2024-12-31", "--format", "csv.gz", "--output", str(output_dir)],
+                   cwd=root, check=True, capture_output=True, timeout=120)
+    df = pd.read_csv(output_dir / "kursy.csv.gz")
+    assert set(df["code"]) == {currency, "USD"}, f"Złe waluty w pliku: {set(df['code'])}"
+
+    rates = requests.get(server_url(f"/api/rates?currency={currency}&start=2024-01-01&end=2024-12-31")).json()["rates"]
+    exported = df[df["code"] == currency]
+    assert list(exported["date"]) == [r["date"] for r in rates], f"Inne daty notowań {currency} niż w /api/rates"
+    assert list(exported["mid"]) == [r["mid"] for r in rates], f"Inne kursy {currency} niż w /api/rates"
+
+def check_huge_range(start_server, currency):
+    # pełna historia od 2002 r., więc z zaślepką NBP, żeby test nie pobierał jej z prawdziwego API
+    from nbp import FIRST_DATE
+    stub_module = nbp_stub()
+    stub = stub_module.start()
+    try:
+        base_url = start_server(NBP_API_URL=stub_module.url(stub), SYNC_WAIT="120")
+        for query in ("time=1000000", "years=100000"):
+            for path in ("/", "/api/rates", "/download/excel", "/batch"):
+                response = requests.get(f"{base_url}{path}?currency={currency}&{query}")
+                assert response.status_code == 200, f"HTTP status {response.status_code} z {path}?{query}"
+
+            rates = requests.get(f"{base_url}/api/rates?currency={currency}&{query}").json()["rates"]
+            assert rates[0]["date"] == FIRST_DATE.isoformat(), f"Zakres {query} zaczyna się od {rates[0]['date']}"
+            excel = requests.get(f"{base_url}/download/excel?currency={currency}&{query}")
+            df = pd.read_excel(io.BytesIO(excel.content))
+            assert str(df["date"].min().date()) == FIRST_DATE.isoformat(), f"Excel dla {query} zaczyna się od {df['date'].min()}"
+    finally:
+        stub.shutdown()
+
+def check_downsample(method, points):
+    import math
+    from datetime import date, timedelta
+    import downsample
+
+    rates = [((date(2020, 1, 1) + timedelta(days=i)).isoformat(), 4 + math.sin(i / 30) + 0.1 * math.sin(i))
+             for i in range(1000)]
+    reduced = downsample.reduce(rates, method, points)
+    assert len(reduced) <= points, f"{method}: {len(reduced)} punktów przy limicie {points}"
+    assert reduced[0] == rates[0] and reduced[-1] == rates[-1], f"{method}: brak pierwszego lub ostatniego punktu"
+    dates = [d for d, _ in reduced]
+    assert dates == sorted(set(dates)), f"{method}: punkty nie są uporządkowane po dacie"
+    assert set(reduced) <= set(rates), f"{method}: punkty spoza danych wejściowych"
+    assert downsample.reduce(rates[:points], method, points) == rates[:points], f"{method}: zmienione krótkie dane"
+
+def check_api_points(currency, points):
+    for path in ("/api/rates", "/api/analytics"):
+        url = server_url(f"{path}?currency={currency}&years=5&points={points}&downsample=minmax")
+        response = requests.get(url)
+        assert response.status_code == 200, f"HTTP status {response.status_code} z {path}"
+        rates = response.json()["rates"]
+        assert 0 < len(rates) <= points, f"{path}: {len(rates)} punktów przy points={points}"
+
+def get_table_codes(table):
+    response = requests.get(server_url("/api/currencies"))
+    return {c["code"] for c in response.json()["currencies"] if c["table"] == table}
+
+def get_batch_codes(table, week_value):
+    response = requests.get(server_url(f"/batch?table={table}&time={week_value}"))
+    assert response.status_code == 200, f"HTTP status {response.status_code} z /batch"
+    assert 'id="batch-table"' in response.text, "Brak tabeli kursów na stronie /batch"
+    return re.findall(r'<th title="[^"]*">(\w{3})</th>', response.text)
+
+def check_batch_page(table, week_value):
+    codes = get_batch_codes(table, week_value)
+    assert codes, f"Brak walut w zestawieniu tabeli {table}"
+    assert set(codes) <= get_table_codes(table), f"Waluty spoza tabeli {table}: {set(codes) - get_table_codes(table)}"
+
+def check_batch_excel(table, week_value):
+    codes = get_batch_codes(table, week_value)
+    response = requests.get(server_url(f"/download/batch/excel?table={table}&time={week_value}"))
+    assert response.status_code == 200, f"HTTP status {response.status_code} przy pobieraniu Excela"
+    sheets = pd.read_excel(io.BytesIO(response.content), sheet_name=None)
+    assert list(sheets) == codes, f"Arkusze {list(sheets)} nie odpowiadają walutom na stronie {codes}"
+    for code, df in sheets.items():
+        assert list(df.columns) == ["date", "mid"], f"Złe kolumny w arkuszu {code}: {list(df.columns)}"
+        assert len(df) > 0, f"Pusty arkusz {code}"
+
+def check_batch_chart(table, week_value):
+    response = requests.get(server_url(f"/download/batch/chart?table={table}&time={week_value}"))
+    assert response.status_code == 200, f"HTTP status {response.status_code} przy pobieraniu wykresu"
+    assert response.headers["Content-Type"] == "image/png", f"Zły typ pliku: {response.headers['Content-Type']}"
+    assert response.content.startswith(b"\x89PNG"), "Pobrany wykres nie jest plikiem PNG"
+
+def get_api_rates(currency, week_value):
+    return requests.get(server_url(f"/api/rates?currency={currency}&time={week_value}")).json()["rates"]
+
+def check_download_matches_api(currency, week_value, fmt):
+    response = requests.get(server_url(f"/download/{fmt}?currency={currency}&time={week_value}"))
+    assert response.status_code == 200, f"HTTP status {response.status_code} przy pobieraniu {fmt}"
+    read = pd.read_csv if fmt == "csv" else pd.read_parquet
+    df = read(io.BytesIO(response.content))
+    rates = get_api_rates(currency, week_value)
+    assert [str(d)[:10] for d in df["date"]] == [r["date"] for r in rates], f"Inne daty w pliku {fmt} niż w /api/rates"
+    assert list(df["mid"]) == [r["mid"] for r in rates], f"Inne kursy w pliku {fmt} niż w /api/rates"
+
+def check_parquet_unavailable(currency, export_dir, monkeypatch):
+    # bez pyarrow (import kończy się ImportError) /download/parquet odpowiada 501, a nie błędem serwera
+    import sys
+    import app
+    import exports
+    monkeypatch.setitem(sys.modules, "pyarrow", None)
+    monkeypatch.setitem(sys.modules, "pyarrow.parquet", None)
+    monkeypatch.setattr(exports, "EXPORT_DIR", str(export_dir))
+    response = app.app.test_client().get(f"/download/parquet?currency={currency}&time=1")
+    assert response.status_code == 501, f"Oczekiwano 501 bez pyarrow, otrzymano {response.status_code}"
+
+def nbp_stub():
+    sys.path.insert(0, str(Path(__file__).parent.parent / "bench"))
+    import nbp_stub
+    return nbp_stub
+
+def nbp_status(base_url):
+    return requests.get(f"{base_url}/ready").json()["nbp"]
+
+def mark_outdated(db_path):
+    # ostatnie sprawdzenie NBP dawno temu: kolejne zapytanie dostaje zapisane dane, a nowe są pobierane w tle
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("UPDATE sync SET checked = ?", ("2000-01-01T00:00:00",))
+
+def check_stale_while_revalidate(start_server, db_path):
+    stub_module = nbp_stub()
+    stub = stub_module.start()
+    try:
+        base_url = start_server(NBP_API_URL=stub_module.url(stub))
+        url = f"{base_url}/api/rates?currency=EUR&time=2"
+        fresh = requests.get(url)
+        assert fresh.status_code == 200, f"HTTP status {fresh.status_code} z /api/rates"
+        assert fresh.json()["stale"] is False, "Świeże dane oznaczone jako nieaktualne"
+        assert not fresh.headers["ETag"].endswith('-stale"'), "ETag świeżych danych z dopiskiem -stale"
+
+        mark_outdated(db_path)
+        stale = requests.get(url)
+        assert stale.status_code == 200, f"HTTP status {stale.status_code} z /api/rates"
+        assert stale.json()["stale"] is True, "Brak oznaczenia nieaktualnych danych"
+        assert stale.json()["rates"] == fresh.json()["rates"], "Nieaktualna odpowiedź nie zawiera zapisanych kursów"
+        assert stale.headers["ETag"].endswith('-stale"'), f"ETag bez dopisku -stale: {stale.headers['ETag']}"
+        assert "max-age=60" in stale.headers["Cache-Control"], f"Zły Cache-Control: {stale.headers['Cache-Control']}"
+
+        deadline = time.monotonic() + 10
+        while requests.get(url).json()["stale"]:
+            assert time.monotonic() < deadline, "Odświeżanie w tle nie zakończyło się"
+            time.sleep(0.1)
+
+        mark_outdated(db_path)
+        page = requests.get(f"{base_url}/?currency=EUR&time=2")
+        assert 'id="stale"' in page.text, "Brak informacji o nieaktualnych danych na stronie"
+    finally:
+        stub.shutdown()
+
+def use_stub_in_process(monkeypatch, **options):
+    # moduł nbp w procesie testów, połączony z zaślepką i z wyzerowanym wyłącznikiem
+    import nbp
+    stub_module = nbp_stub()
+    stub = stub_module.start(**options)
+    monkeypatch.setattr(nbp, "API_URL", stub_module.url(stub))
+    monkeypatch.setattr(nbp, "_failures", 0)
+    monkeypatch.setattr(nbp, "_open_until", 0.0)
+    return nbp, stub
+
+def get_json_together(nbp, path, callers=8):
+    barrier = threading.Barrier(callers)
+
+    def call():
+        barrier.wait()
+        try:
+            return nbp.get_json(path)
+        except nbp.FetchError as e:
+            return e
+
+    with ThreadPoolExecutor(callers) as pool:
+        return list(pool.map(lambda _: call(), range(callers)))
+
+def check_single_flight(monkeypatch):
+    nbp, stub = use_stub_in_process(monkeypatch, latency=0.5)
+    try:
+        results = get_json_together(nbp, "exchangerates/tables/A")
+        assert all(r == results[0] and not isinstance(r, Exception) for r in results), "Różne wyniki tego samego zapytania"
+        assert stub.hits["/api/exchangerates/tables/A/"] == 1, f"Zapytań do NBP: {dict(stub.hits)}, oczekiwano 1"
+    finally:
+        stub.shutdown()
+
+def check_single_flight_error(monkeypatch):
+    # NBP cały czas odpowiada 503: błąd pierwszego wywołania dostają też wszystkie czekające
+    nbp, stub = use_stub_in_process(monkeypatch, latency=0.3, failures=1000)
+    try:
+        results = get_json_together(nbp, "exchangerates/tables/A")
+        assert all(isinstance(r, nbp.FetchError) for r in results), f"Oczekiwano FetchError u wszystkich: {results}"
+        # jedno zapytanie i trzy ponowienia (Retry total=3), tylko od pierwszego wywołania
+        assert stub.hits["/api/exchangerates/tables/A/"] == 4, f"Zapytań do NBP: {dict(stub.hits)}, oczekiwano 4"
+    finally:
+        stub.shutdown()
+
+def check_retry_5xx(monkeypatch):
+    nbp, stub = use_stub_in_process(monkeypatch, failures=2)
+    try:
+        data = nbp.get_json("exchangerates/tables/A")
+        assert data and data[0]["rates"], "Brak tabeli po ponowieniu zapytania"
+        assert stub.hits["/api/exchangerates/tables/A/"] == 3, f"Zapytań do NBP: {dict(stub.hits)}, oczekiwano 3"
+        assert not nbp.breaker_open(), "Wyłącznik otwarty po udanym ponowieniu"
+    finally:
+        stub.shutdown()
+
+def cache_count(base_url, result):
+    text = requests.get(f"{base_url}/metrics").text
+    counts = re.findall(rf'^cache_requests_total{{cache="\w+",result="{result}"}} (\d+)', text, re.M)
+    return sum(int(count) for count in counts)
+
+def check_warm(start_server, tmp_path, week_value):
+    stub_module = nbp_stub()
+    stub = stub_module.start()
+    env = {
+        "NBP_API_URL": stub_module.url(stub),
+        "RATES_DB": str(tmp_path / "rates.db"),
+        "CHART_DIR": str(tmp_path / "charts"),
+        "EXPORT_DIR": str(tmp_path / "exports"),
+        "CATALOG_PATH": str(tmp_path / "catalog.json"),
+    }
+    try:
+        root = Path(__file__).parent.parent
+        subprocess.run([sys.executable, str(root / "warm.py"), "--codes", "EUR,USD"],
+                       cwd=root, env=dict(os.environ, **env), check=True, capture_output=True, timeout=300)
+        base_url = start_server(**env)
+
+        # wszystko przygotowane przez warm.py: serwer tylko odczytuje gotowe pliki
+        for code in ("EUR", "USD"):
+            for path in ("/download/chart", "/download/excel"):
+                hits, misses = cache_count(base_url, "hit"), cache_count(base_url, "miss")
+                response = requests.get(f"{base_url}{path}?currency={code}&time={week_value}")
+                assert response.status_code == 200, f"HTTP status {response.status_code} z {path} dla {code}"
+                assert cache_count(base_url, "hit") == hits + 1, f"{path} dla {code} nie trafił w przygotowany plik"
+                assert cache_count(base_url, "miss") == misses, f"{path} dla {code} wygenerował plik od nowa"
+    finally:
+        stub.shutdown()
+
+def check_duplicate_codes(start_server):
+    stub_module = nbp_stub()
+    stub = stub_module.start()
+    try:
+        base_url = start_server(NBP_API_URL=stub_module.url(stub))
+        same = requests.get(f"{base_url}/api/cross?base=EUR&quote=EUR&time=1")
+        assert same.status_code == 200, f"HTTP status {same.status_code} z /api/cross dla EUR/EUR"
+        assert {row["rate"] for row in same.json()["rates"]} == {1.0}, "Kurs EUR/EUR różny od 1"
+
+        # każda para brakujących walut z powtórzonym kodem; wcześniej zawieszała jeden z wątków odświeżania
+        for code in ("GBP", "CHF", "JPY", "CAD"):
+            response = requests.get(f"{base_url}/api/cross/matrix?codes={code},{code}&time=1")
+            assert response.status_code == 200, f"HTTP status {response.status_code} z /api/cross/matrix dla {code},{code}"
+            assert response.json()["codes"] == [code], f"Powtórzony kod w macierzy: {response.json()['codes']}"
+
+        for code in ("NOK", "CZK"):
+            response = requests.get(f"{base_url}/api/rates?currency={code}&time=1")
+            assert response.status_code == 200, f"HTTP status {response.status_code} z /api/rates dla {code}"
+    finally:
+        stub.shutdown()
+
+def check_circuit_breaker(start_server, cooldown=5):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    # pod tym portem na razie nic nie słucha, więc każde zapytanie do NBP kończy się błędem połączenia
+    base_url = start_server(NBP_API_URL=f"http://127.0.0.1:{port}/api", NBP_BREAKER_FAILURES="2",
+                            NBP_BREAKER_COOLDOWN=str(cooldown), SYNC_WAIT="30")
+    url = f"{base_url}/api/rates?currency=EUR&time=1"
+    for _ in range(5):
+        if nbp_status(base_url) == "unavailable":
+            break
+        assert requests.get(url).status_code == 404, "Oczekiwano 404 bez dostępu do NBP"
+    assert nbp_status(base_url) == "unavailable", "Wyłącznik nie otworzył się po kolejnych błędach NBP"
+
+    # otwarty wyłącznik: bez zapytań do NBP, odpowiedź od razu
+    started = time.monotonic()
+    assert requests.get(url).status_code == 404, "Oczekiwano 404 przy otwartym wyłączniku"
+    assert time.monotonic() - started < 1, "Przy otwartym wyłączniku serwer nadal czeka na NBP"
+
+    # po przerwie jedno zapytanie próbne; NBP dalej nie działa, więc wyłącznik znów się otwiera
+    time.sleep(cooldown + 0.5)
+    requests.get(url)
+    assert nbp_status(base_url) == "unavailable", "Wyłącznik zamknął się mimo nieudanej próby"
+
+    stub_module = nbp_stub()
+    stub = stub_module.start(port)
+    try:
+        deadline = time.monotonic() + 3 * cooldown
+        while requests.get(url).status_code != 200:
+            assert time.monotonic() < deadline, "Wyłącznik nie zamknął się po powrocie NBP"
+            time.sleep(0.5)
+        assert nbp_status(base_url) == "ok", "Po udanej próbie wyłącznik powinien być zamknięty"
+    finally:
+        stub.shutdown()
@@ -13,7 +13,35 @@ from helpers import (
     select_three_options,
     setup_browser,
     check_all_currency_options_present,
-    check_all_time_options_present
+    check_all_time_options_present,
+    check_excel_matches_time,
+    check_api_rates,
+    check_excel_for_long_date_range,
+    check_server_ready,
+    check_not_modified,
+    check_metrics,
+    check_cross_rates,
+    check_currency_in_catalog,
+    check_bulk_export,
+    check_huge_range,
+    check_downsample,
+    check_api_points,
+    check_batch_page,
+    check_batch_excel,
+    check_batch_chart,
+    check_download_matches_api,
+    check_parquet_unavailable,
+    check_stale_while_revalidate,
+    check_circuit_breaker,
+    check_duplicate_codes,
+    check_memo_bytes,
+    check_series_merge,
+    check_indexed,
+    check_single_flight,
+    check_single_flight_error,
+    check_retry_5xx,
+    check_warm,
+    server_url
 )
 
 DOWNLOAD_DIR = "downloads"
@@ -21,8 +49,7 @@ os.makedirs(DOWNLOAD_DIR, exist_ok=True)
 
 def test_open_currency_page_dynamic(page, dynamic_currency_codes):
     for currency_code in dynamic_currency_codes:
-        url = f"http://localhost:1111/?currency={currency_code}"
-        page.goto(url)
+        page.goto(server_url(f"/?currency={currency_code}"))
         assert_currency_page_loaded(page, currency_code)
 
 def test_switch_page_dynamic(page, dynamic_currency_codes, extra):
@@ -50,3 +77,94 @@ def test_all_currency_options_present(page, currencies_number):
 
 def test_all_time_options_present(page, weeks_number):
     check_all_time_options_present(page, weeks_number)
+
+def test_download_excel_matches_time(currency):
+    check_excel_matches_time(currency, "1", "8")
+
+def test_api_rates(currency, week):
+    check_api_rates(currency, week)
+
+def test_download_excel_for_long_date_range(currency):
+    check_excel_for_long_date_range(currency)
+
+def test_server_ready():
+    check_server_ready()
+
+def test_not_modified(currency, week):
+    for path in ("/", "/download/excel", "/download/chart"):
+        check_not_modified(f"{path}?currency={currency}&time={week}")
+
+def test_metrics(currency):
+    check_metrics(currency)
+
+def test_cross_rates(currency, week):
+    check_cross_rates(currency, week)
+
+def test_memo_bytes(monkeypatch):
+    check_memo_bytes(monkeypatch)
+
+def test_series_merge():
+    check_series_merge()
+
+def test_indexed(tmp_path, monkeypatch):
+    check_indexed(tmp_path / "rates.db", monkeypatch)
+
+def test_single_flight(monkeypatch):
+    check_single_flight(monkeypatch)
+
+def test_single_flight_error(monkeypatch):
+    check_single_flight_error(monkeypatch)
+
+def test_retry_5xx(monkeypatch):
+    check_retry_5xx(monkeypatch)
+
+def test_currency_in_catalog(currency):
+    check_currency_in_catalog(currency)
+
+def test_bulk_export(currency, tmp_path):
+    check_bulk_export(currency, tmp_path)
+
+def test_huge_range(isolated_server, currency):
+    check_huge_range(isolated_server, currency)
+
+@pytest.mark.parametrize("method", ["lttb", "minmax"])
+@pytest.mark.parametrize("points", [3, 4, 5, 50, 600])
+def test_downsample(method, points):
+    check_downsample(method, points)
+
+def test_api_points(currency):
+    check_api_points(currency, 50)
+
+@pytest.mark.parametrize("table", ["A", "B"])
+def test_batch_page(table, week):
+    check_batch_page(table, week)
+
+@pytest.mark.parametrize("table", ["A", "B"])
+def test_batch_excel(table, week):
+    check_batch_excel(table, week)
+
+@pytest.mark.parametrize("table", ["A", "B"])
+def test_batch_chart(table, week):
+    check_batch_chart(table, week)
+
+def test_download_csv_matches_api(currency, week):
+    check_download_matches_api(currency, week, "csv")
+
+def test_download_parquet_matches_api(currency, week):
+    pytest.importorskip("pyarrow")
+    check_download_matches_api(currency, week, "parquet")
+
+def test_download_parquet_without_pyarrow(currency, tmp_path, monkeypatch):
+    check_parquet_unavailable(currency, tmp_path, monkeypatch)
+
+def test_stale_while_revalidate(isolated_server, tmp_path):
+    check_stale_while_revalidate(isolated_server, tmp_path / "rates.db")
+
+def test_circuit_breaker(isolated_server):
+    check_circuit_breaker(isolated_server)
+
+def test_duplicate_codes(isolated_server):
+    check_duplicate_codes(isolated_server)
+
+def test_warm(isolated_server, tmp_path, week):
+    check_warm(isolated_server, tmp_path, week)
@@ -0,0 +1,129 @@
+import argparse
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+import catalog
+import charts
+import downsample
+import exports
+import nbp
+import renderer
+import store
+from app import WEEKS, weeks_period
+
+# NBP publikuje tabelę A w dni robocze między 11:45 a 12:15
+PUBLISH_AT = '12:30'
+RETRY_EVERY = timedelta(minutes=15)
+RETRY_UNTIL = '16:00'
+
+log = logging.getLogger('warm')
+
+
+def _warm_currency(code, label, rates):
+    charts.get_chart(code, label, downsample.reduce(rates))
+    for fmt in exports.EXPORTS:
+        try:
+            exports.get_export(code, rates, fmt)
+        except exports.ExportUnavailable:
+            pass
+
+
+def warm_all(today=None, codes=None):
+    today = today or date.today()
+    longest = weeks_period(max(WEEKS), today)
+
+    try:
+        catalog.refresh()
+    except (nbp.FetchError, OSError) as e:
+        log.warning("Nie udało się odświeżyć listy walut, zostaje zapisana: %s", e)
+    codes = codes or catalog.codes()
+
+    store.sync_all(codes, longest.start, force=True)
+    series = store.get_rates_many(codes, longest.start, today)
+
+    tasks = []
+    with ThreadPoolExecutor(max(1, renderer.WORKERS)) as pool:
+        for weeks in WEEKS:
+            period = weeks_period(weeks, today)
+            start = period.start.isoformat()
+            sliced = {code: [r for r in rates if r[0] >= start] for code, rates in series.items()}
+            sliced = {code: rates for code, rates in sliced.items() if rates}
+            if not sliced:
+                continue
+
+            for code, rates in sliced.items():
+                tasks.append(pool.submit(_warm_currency, code, period.label, rates))
+            # zestawienia na stronie /batch są osobno dla każdej tabeli NBP
+            for table in catalog.TABLES:
+                batch = {code: sliced[code] for code in catalog.codes(table) if code in sliced}
+                if not batch:
+                    continue
+                tasks.append(pool.submit(
+                    charts.get_batch_chart, period.label,
+                    {code: downsample.reduce(rates) for code, rates in batch.items()}
+                ))
+                tasks.append(pool.submit(exports.get_batch_export, batch))
+
+        for task in tasks:
+            task.result()
+
+    latest = max((rates[-1][0] for rates in series.values() if rates), default=None)
+    log.info("Przygotowano %d zestawów, najnowsze notowanie: %s", len(tasks), latest)
+    return date.fromisoformat(latest) if latest else None
+
+
+def _at(value):
+    return datetime.strptime(value, '%H:%M').time()
+
+
+def warm_until_published(retry_until):
+    while True:
+        try:
+            latest = warm_all()
+        except nbp.FetchError as e:
+            log.warning("Nie udało się pobrać danych z NBP: %s", e)
+            latest = None
+        except Exception:
+            # w serve.py --warm to wątek w tle: po nieoczekiwanym błędzie próbujemy dalej, zamiast go kończyć
+            log.exception("Przygotowanie danych nie powiodło się")
+            latest = None
+
+        now = datetime.now()
+        published = latest == now.date() or now.weekday() >= 5
+        if published or now.time() >= retry_until:
+            return
+        log.info("Brak dzisiejszej tabeli, ponowna próba za %s", RETRY_EVERY)
+        time.sleep(RETRY_EVERY.total_seconds())
+
+
+def run_forever(at=PUBLISH_AT, retry_until=RETRY_UNTIL):
+    at, retry_until = _at(at), _at(retry_until)
+    warm_until_published(retry_until)
+    while True:
+        when = nbp.next_publication(datetime.now(), at)
+        log.info("Następne przygotowanie danych: %s", when)
+        time.sleep(max(0, (when - datetime.now()).total_seconds()))
+        warm_until_published(retry_until)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Pobiera nowe notowania i przygotowuje wykresy oraz pliki dla wszystkich walut i zakresów.')
+    parser.add_argument('--daemon', action='store_true', help='działa w tle i powtarza w każdy dzień roboczy')
+    parser.add_argument('--at', default=PUBLISH_AT, help='godzina uruchomienia (GG:MM), domyślnie %(default)s')
+    parser.add_argument('--codes', help='tylko te waluty, po przecinku, np. EUR,USD (domyślnie wszystkie z listy NBP)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    try:
+        if args.daemon:
+            run_forever(args.at)
+        else:
+            warm_all(codes=args.codes and [code for code in args.codes.upper().split(',') if code])
+    finally:
+        renderer.shutdown()
+
+
+if __name__ == '__main__':
+    main()